@@ -0,0 +1,574 @@
+"""
+Offline benchmark of the full pipeline against local stand-ins.
+
+Starts a fake JSON-RPC node (eth_getLogs, eth_getBlockByNumber, eth_call,
+eth_blockNumber), a fake Snapshot GraphQL endpoint and a fake coins.llama.fi,
+all answering from one fixture world, then runs each stage in a scratch
+directory with cold caches. Every service can add latency and enforce a rate
+limit (answering 429 when it is exceeded). Reports wall time, peak Python
+memory (tracemalloc) and HTTP request and call counts per stage. Client-side
+limits still apply, so e.g. LLAMA_RATE_LIMIT bounds the price stage. A
+stage that writes no rows fails the run, so a stage that silently does
+nothing is not reported as fast.
+
+The world is generated from a seed, or replayed from a fixture file saved with
+--save-fixtures so runs can be compared on identical inputs.
+
+    python dev-tools/benchmark.py [--scale 30] [--latency 20] [--rpc-rate 50]
+                                  [--fixtures FILE] [--save-fixtures FILE]
+                                  [--json FILE]
+"""
+
+from collections import Counter
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+import argparse
+import bisect
+import glob
+import importlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "votium"))
+
+from eth_abi import decode, encode
+from eth_utils import keccak, to_checksum_address
+
+from votium import metrics
+from votium.decoder import EventDecoder
+from votium.executor import run_rounds
+from votium.multicall import AGGREGATE3
+from votium.rounds import get_last_round
+from votium.tokens import DECIMALS, NAME, SYMBOL
+
+VOTIUM1_ADDRESS = "0x19BBC3463Dd8d07f55438014b021Fb457EBD4595"
+VOTIUM2_ADDRESS = "0x63942E31E98f1833A234077f47880A66136a2D1e"
+V1_START_BLOCK = 13209937
+V2_START_BLOCK = 18043767
+BLOCKS_PER_ROUND = 100_800
+BLOCK_TIME_ORIGIN = 1631270000
+
+CHOICES = 150
+TOKENS = 40
+
+
+# Fixture world
+
+
+def _topic(abi_file, event):
+    with open(os.path.join(REPO_DIR, abi_file)) as f:
+        return EventDecoder(json.load(f), event).topic
+
+
+def _word(type, value):
+    return "0x" + encode([type], [value]).hex()
+
+
+def _log(address, topics, data, block, index):
+    return {
+        "address": address.lower(),
+        "topics": topics,
+        "data": "0x" + data.hex(),
+        "blockNumber": hex(block),
+        "blockHash": _block_hash(block),
+        "transactionHash": "0x" + keccak(text=f"{block}:{index}").hex(),
+        "transactionIndex": hex(index),
+        "logIndex": hex(index),
+        "removed": False,
+    }
+
+
+def _block_hash(block):
+    return "0x" + keccak(block.to_bytes(32, "big")).hex()
+
+
+def _block_time(block):
+    return BLOCK_TIME_ORIGIN + (block - V1_START_BLOCK) * 12
+
+
+def make_world(scale: int, seed: int) -> dict:
+    """Generate proposals, tokens and Votium events for every round so far."""
+
+    rng = random.Random(seed)
+    last_round = get_last_round()
+
+    with open(os.path.join(REPO_DIR, "data/gauges.json")) as f:
+        gauges = list(json.load(f)["gauges"].items())[:CHOICES]
+    choices = [value["shortName"] for _, value in gauges]
+
+    tokens = {}
+    for n in range(TOKENS):
+        address = to_checksum_address(keccak(text=f"token{n}")[:20])
+        tokens[address.lower()] = [f"TKN{n}", f"Token {n}", rng.choice([18, 18, 6, 8])]
+    token_addresses = [to_checksum_address(t) for t in tokens]
+
+    proposals = []
+    for round in range(1, last_round + 1):
+        scores = [rng.random() * 1e6 for _ in choices]
+        created = 1631000000 + round * 14 * 86400
+        proposals.append(
+            {
+                "id": "0x" + keccak(text=f"proposal{round}").hex(),
+                "title": f"Gauge Weight for Week of {round}",
+                "start": created,
+                "end": created + 5 * 86400,
+                "author": "0x0000000000000000000000000000000000000000",
+                "created": created,
+                "choices": choices,
+                "scores": scores,
+                "scores_state": "final" if round < last_round else "pending",
+                "scores_total": sum(scores),
+            }
+        )
+
+    initiated_topic = _topic("data/abis/votium1.json", "Initiated")
+    bribed_topic = _topic("data/abis/votium1.json", "Bribed")
+    incentive_topic = _topic("data/abis/votium2.json", "NewIncentive")
+
+    initiated, bribed, incentives = [], [], []
+    v1_spacing = (V2_START_BLOCK - V1_START_BLOCK) // 53
+    for round in range(1, 53):
+        block = V1_START_BLOCK + round * v1_spacing
+        proposal = keccak(hexstr=proposals[round - 1]["id"])
+        initiated.append(
+            _log(VOTIUM1_ADDRESS, [initiated_topic], encode(["bytes32"], [proposal]), block, 0)
+        )
+        for n in range(scale):
+            data = encode(
+                ["address", "uint256", "uint256"],
+                [rng.choice(token_addresses), rng.randrange(10**15, 10**24), rng.randrange(CHOICES)],
+            )
+            bribed.append(
+                _log(
+                    VOTIUM1_ADDRESS,
+                    [bribed_topic, _word("bytes32", proposal)],
+                    data,
+                    block + 1 + n // 4,
+                    n % 4,
+                )
+            )
+
+    for round in range(53, last_round + 2):
+        block = V2_START_BLOCK + (round - 53) * BLOCKS_PER_ROUND
+        for n in range(scale):
+            data = encode(
+                ["uint256", "address", "uint256", "uint256", "address[]", "bool"],
+                [
+                    n,
+                    rng.choice(token_addresses),
+                    rng.randrange(10**15, 10**24),
+                    rng.randrange(10**18),
+                    [],
+                    rng.random() < 0.1,
+                ],
+            )
+            incentives.append(
+                _log(
+                    VOTIUM2_ADDRESS,
+                    [
+                        incentive_topic,
+                        _word("uint256", round),
+                        _word("address", gauges[rng.randrange(CHOICES)][0]),
+                        _word("address", token_addresses[0]),
+                    ],
+                    data,
+                    block + 1 + n // 4,
+                    n % 4,
+                )
+            )
+
+    return {
+        "tip": V2_START_BLOCK + (last_round + 2 - 53) * BLOCKS_PER_ROUND,
+        "proposals": proposals,
+        "tokens": tokens,
+        "logs": initiated + bribed + incentives,
+    }
+
+
+# Fake services
+
+
+class RateLimit:
+    """Allow rate requests per second; 0 means unlimited."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class FakeService:
+    """Threaded local HTTP server answering through handle(method, path, body)."""
+
+    def __init__(self, name, handle, latency, rate):
+        self.name = name
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        limit = RateLimit(rate)
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                service.count("http")
+                time.sleep(latency)
+                if not limit.allow():
+                    service.count("429")
+                    status, payload = 429, {"error": "rate limited"}
+                else:
+                    status, payload = handle(service, method, self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def count(self, kind, n=1):
+        with self.lock:
+            self.counts[kind] += n
+
+    def snapshot(self):
+        with self.lock:
+            return Counter(self.counts)
+
+
+class Node:
+    """JSON-RPC answers from the fixture world."""
+
+    def __init__(self, world):
+        self.tip = world["tip"]
+        self.tokens = world["tokens"]
+        self.logs = {}
+        for log in sorted(world["logs"], key=lambda l: (int(l["blockNumber"], 16), int(l["logIndex"], 16))):
+            self.logs.setdefault((log["address"], log["topics"][0]), []).append(log)
+        self.blocks = {key: [int(l["blockNumber"], 16) for l in logs] for key, logs in self.logs.items()}
+
+    def get_logs(self, query):
+        key = (query["address"].lower(), query["topics"][0])
+        blocks = self.blocks.get(key, [])
+        lo = bisect.bisect_left(blocks, int(query["fromBlock"], 16))
+        hi = bisect.bisect_right(blocks, int(query["toBlock"], 16))
+        return self.logs.get(key, [])[lo:hi]
+
+    def get_block(self, number):
+        number = self.tip if number == "latest" else int(number, 16)
+        return {
+            "number": hex(number),
+            "hash": _block_hash(number),
+            "parentHash": _block_hash(number - 1),
+            "timestamp": hex(_block_time(number)),
+            "transactions": [],
+        }
+
+    def call_token(self, target, calldata):
+        """Return the result of a token call, or None if it reverts."""
+
+        token = self.tokens.get(target.lower())
+        if token is None:
+            return None
+        if calldata == SYMBOL:
+            return encode(["string"], [token[0]])
+        if calldata == NAME:
+            return encode(["string"], [token[1]])
+        if calldata == DECIMALS:
+            return encode(["uint8"], [token[2]])
+        return None
+
+    def call(self, tx):
+        data = bytes.fromhex(tx["data"][2:])
+        if data[:4] != AGGREGATE3:
+            return self.call_token(tx["to"], data)
+        (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+        results = []
+        for target, _, calldata in calls:
+            result = self.call_token(target, calldata)
+            results.append((result is not None, result or b""))
+        return encode(["(bool,bytes)[]"], [results])
+
+    def answer(self, request):
+        method, params = request["method"], request.get("params", [])
+        if method == "eth_blockNumber":
+            result = hex(self.tip)
+        elif method == "eth_chainId":
+            result = "0x1"
+        elif method == "eth_getBlockByNumber":
+            result = self.get_block(params[0])
+        elif method == "eth_getLogs":
+            result = self.get_logs(params[0])
+        elif method == "eth_call":
+            result = self.call(params[0])
+            if result is None:
+                return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": 3, "message": "execution reverted"}}
+            result = "0x" + result.hex()
+        else:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": f"{method} not supported"}}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+
+def rpc_handler(node):
+    def handle(service, method, path, body):
+        request = json.loads(body)
+        requests = request if isinstance(request, list) else [request]
+        for r in requests:
+            service.count(r["method"])
+        answers = [node.answer(r) for r in requests]
+        return 200, answers if isinstance(request, list) else answers[0]
+
+    return handle
+
+
+def snapshot_handler(world):
+    proposals = {p["id"]: p for p in world["proposals"]}
+    listed = ["id", "title", "start", "end", "author", "created"]
+    detailed = ["id", "choices", "scores", "scores_state", "scores_total"]
+
+    def handle(service, method, path, body):
+        query = json.loads(body)["query"]
+        service.count("graphql")
+        ids = re.search(r"id_in: (\[.*?\])", query)
+        if ids:
+            found = [proposals[i] for i in json.loads(ids.group(1)) if i in proposals]
+            return 200, {"data": {"proposals": [{k: p[k] for k in detailed} for p in found]}}
+        created_gte = int(re.search(r"created_gte: (\d+)", query).group(1))
+        first = int(re.search(r"first: (\d+)", query).group(1))
+        page = [p for p in world["proposals"] if p["created"] >= created_gte][:first]
+        return 200, {"data": {"proposals": [{k: p[k] for k in listed} for p in page]}}
+
+    return handle
+
+
+def llama_handler(service, method, path, body):
+    # /prices/historical/{timestamp}/{chain:token,...}
+    service.count("prices")
+    coins = unquote(path.rstrip("/").split("/")[-1]).split(",")
+    return 200, {
+        "coins": {
+            coin: {"price": 1 + int(coin[-6:], 16) % 1000 / 100, "symbol": "X", "confidence": 0.99}
+            for coin in coins
+        }
+    }
+
+
+# Stages
+
+
+def output_rows(patterns) -> int:
+    """Count the data rows of the CSV files matching patterns."""
+
+    rows = 0
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            with open(path) as f:
+                rows += max(sum(1 for _ in f) - 1, 0)
+    return rows
+
+
+def measure(name, services, fn, results, outputs):
+    before = {service.name: service.snapshot() for service in services}
+    tracemalloc.start()
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        fn()
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows = output_rows(outputs)
+    if not rows:
+        raise RuntimeError(f"Stage {name} wrote no rows to {outputs}")
+
+    counts = {
+        service.name: dict(service.snapshot() - before[service.name]) for service in services
+    }
+    results.append(
+        {"stage": name, "wall": wall, "peak_mb": peak / 2**20, "rows": rows, "requests": counts}
+    )
+
+    # HTTP requests, then the calls they carried (batches carry several)
+    total = sum(c.get("http", 0) for c in counts.values())
+    detail = ", ".join(
+        f"{service}:{kind}={n}"
+        for service, c in counts.items()
+        for kind, n in sorted(c.items())
+        if kind != "http"
+    )
+    print(
+        f"{name:<28} {wall:>8.2f}s {peak / 2**20:>8.1f} MB {rows:>7} rows "
+        f"{total:>7} requests  {detail}"
+    )
+
+
+def run(args):
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            world = json.load(f)
+    else:
+        world = make_world(args.scale, args.seed)
+    if args.save_fixtures:
+        with open(args.save_fixtures, "w") as f:
+            json.dump(world, f)
+
+    latency = args.latency / 1000
+    rpc = FakeService("rpc", rpc_handler(Node(world)), latency, args.rpc_rate)
+    snapshot_service = FakeService("snapshot", snapshot_handler(world), latency, args.snapshot_rate)
+    llama = FakeService("llama", llama_handler, latency, args.llama_rate)
+    services = [rpc, snapshot_service, llama]
+
+    os.environ["WEB3_HTTP_PROVIDER"] = rpc.url
+    os.environ["SNAPSHOT_URL"] = snapshot_service.url
+    os.environ["LLAMA_URL"] = llama.url
+
+    work_dir = tempfile.mkdtemp(prefix="votium-bench-")
+    shutil.copytree(os.path.join(REPO_DIR, "data"), os.path.join(work_dir, "data"))
+    os.chdir(work_dir)
+    try:
+        import incentives
+        import price
+        import snapshot
+
+        # Modules load their clients on first use. Load them up front so the
+        # import time is not charged to whichever stage needs them first.
+        for module in ["requests", "votium.decoder", "votium.pricing", "votium.tokens"]:
+            importlib.import_module(module)
+        incentives.get_w3()
+
+        last_round = get_last_round()
+        print(
+            f"{last_round} rounds, {len(world['logs'])} logs, "
+            f"latency {args.latency}ms, work dir {work_dir}"
+        )
+        print(f"{'stage':<28} {'wall':>9} {'peak':>11} {'rows':>12} {'total':>7}")
+
+        def incentive_files(rounds):
+            return [incentives.incentives_file(r) for r in rounds]
+
+        results = []
+        state = {}
+        measure(
+            "get_snapshot_list",
+            services,
+            snapshot.get_snapshot_list,
+            results,
+            ["output/snapshot/snapshot_list.csv"],
+        )
+        measure(
+            "get_snapshot",
+            services,
+            lambda: (
+                snapshot.refresh_snapshots(range(1, last_round + 1)),
+                [snapshot.get_snapshot(r) for r in range(1, last_round + 1)],
+            ),
+            results,
+            ["output/snapshot/round_*_snapshot.csv"],
+        )
+        measure(
+            "get_events (v1)",
+            services,
+            lambda: state.update(v1=incentives.get_votium1_events()),
+            results,
+            [f"cache/events/{VOTIUM1_ADDRESS}-*/*.csv"],
+        )
+        measure(
+            "get_events (v2)",
+            services,
+            incentives.get_votium2_events,
+            results,
+            [f"cache/events/{VOTIUM2_ADDRESS}-*/*.csv"],
+        )
+        measure(
+            "process_incentive_events_v1",
+            services,
+            lambda: incentives.process_incentive_events_v1(
+                incentives.get_snapshot_list_map(), *state["v1"]
+            ),
+            results,
+            incentive_files(range(1, 53)),
+        )
+        measure(
+            "process_incentive_events_v2",
+            services,
+            incentives.process_incentive_events_v2,
+            results,
+            incentive_files(range(53, last_round + 1)),
+        )
+        measure(
+            "price_round",
+            services,
+            lambda: run_rounds(price.price_round, range(1, last_round + 1)),
+            results,
+            ["output/price/round_*_price.csv"],
+        )
+        report = metrics.write_report()
+    finally:
+        os.chdir(REPO_DIR)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = sum(r["wall"] for r in results)
+    print(f"{'total':<28} {total:>8.2f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"args": vars(args), "stages": results, "wall": total, "report": report},
+                f,
+                indent=2,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", type=int, default=30, help="incentives per round")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=20, help="ms added to every request")
+    parser.add_argument("--rpc-rate", type=float, default=0, help="RPC requests/sec (0 = unlimited)")
+    parser.add_argument("--snapshot-rate", type=float, default=0, help="Snapshot requests/sec")
+    parser.add_argument("--llama-rate", type=float, default=0, help="DefiLlama requests/sec")
+    parser.add_argument("--fixtures", help="replay the world from this fixture file")
+    parser.add_argument("--save-fixtures", help="save the world to this fixture file")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
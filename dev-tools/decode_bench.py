@@ -0,0 +1,135 @@
+"""
+Compare decoding raw logs with votium.decoder against the web3 event path.
+
+Generates synthetic eth_getLogs results for the Votium events, checks that
+both paths produce identical rows and prints logs/sec for each. Runs offline.
+
+    python dev-tools/decode_bench.py [count]
+"""
+
+import json
+import random
+import sys
+import time
+
+sys.path.insert(0, "votium")
+
+from eth_abi import encode
+from web3 import Web3
+from web3._utils.events import get_event_data
+from web3._utils.method_formatters import log_entry_formatter
+
+from votium.decoder import EventDecoder
+
+EVENTS = [
+    ("data/abis/votium1.json", "0x19BBC3463Dd8d07f55438014b021Fb457EBD4595", "Initiated"),
+    ("data/abis/votium1.json", "0x19BBC3463Dd8d07f55438014b021Fb457EBD4595", "Bribed"),
+    ("data/abis/votium2.json", "0x63942E31E98f1833A234077f47880A66136a2D1e", "NewIncentive"),
+]
+
+TOKENS = ["0x" + bytes([n]).hex() * 20 for n in range(1, 40)]
+GAUGES = ["0x" + bytes([n]).hex() * 20 for n in range(100, 250)]
+
+
+def _value(type):
+    if type == "address":
+        return random.choice(TOKENS + GAUGES)
+    if type == "address[]":
+        return random.sample(GAUGES, random.randint(0, 3))
+    if type == "bool":
+        return random.random() < 0.5
+    if type == "bytes32":
+        return random.randbytes(32)
+    return random.randint(0, 10**24)
+
+
+def _word(type, value):
+    return "0x" + encode([type], [value]).hex()
+
+
+def make_logs(entry, address, count):
+    """Build raw eth_getLogs results for an event ABI entry."""
+
+    topic = "0x" + Web3.keccak(
+        text=f"{entry['name']}({','.join(i['type'] for i in entry['inputs'])})"
+    ).hex().removeprefix("0x")
+    indexed = [i for i in entry["inputs"] if i["indexed"]]
+    data = [i for i in entry["inputs"] if not i["indexed"]]
+
+    logs = []
+    for n in range(count):
+        block = 18_000_000 + n // 4
+        logs.append(
+            {
+                "address": address.lower(),
+                "topics": [topic] + [_word(i["type"], _value(i["type"])) for i in indexed],
+                "data": "0x" + encode(
+                    [i["type"] for i in data], [_value(i["type"]) for i in data]
+                ).hex(),
+                "blockNumber": hex(block),
+                "transactionHash": "0x" + random.randbytes(32).hex(),
+                "transactionIndex": hex(n % 50),
+                "blockHash": "0x" + random.randbytes(32).hex(),
+                "logIndex": hex(n % 4),
+                "removed": False,
+            }
+        )
+    return logs
+
+
+def web3_rows(codec, entry, logs):
+    """The previous path: web3 log formatting, event decoding, row conversion."""
+
+    rows = []
+    for log in logs:
+        event = get_event_data(codec, entry, log_entry_formatter(log))
+        values = []
+        for key, value in event["args"].items():
+            if isinstance(value, bytes):
+                values.append(value.hex())
+            else:
+                values.append(value)
+        values.extend([
+            event["event"],
+            event["logIndex"],
+            event["transactionIndex"],
+            event["transactionHash"].hex(),
+            event["address"],
+            event["blockHash"].hex(),
+            event["blockNumber"],
+        ])
+        rows.append(values)
+    return rows
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    random.seed(1)
+    codec = Web3().codec
+
+    for abi_file, address, name in EVENTS:
+        with open(abi_file) as f:
+            abi = json.load(f)
+        entry = next(e for e in abi if e.get("type") == "event" and e["name"] == name)
+        logs = make_logs(entry, address, count)
+
+        expected, web3_time = timed(lambda: web3_rows(codec, entry, logs))
+        decoder = EventDecoder(abi, name)
+        rows, fast_time = timed(lambda: decoder.rows(logs))
+        assert rows == expected, f"{name}: decoded rows differ from the web3 path"
+
+        print(
+            f"{name:<13} web3: {count / web3_time:>10,.0f} logs/sec  "
+            f"decoder: {count / fast_time:>10,.0f} logs/sec  "
+            f"({web3_time / fast_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -32,8 +32,7 @@ def fetch(symbol, timestamp):
 
     return price
 
-print("MANUAL_PRICES={")
+# Paste the output into data/manual_prices.json
 for (symbol, timestamp) in MISSING:
     price = fetch(symbol, timestamp)
-    print(f'    "{symbol}:{timestamp}":"{price}",')
-print("}")
\ No newline at end of file
+    print(f'  "{symbol}:{timestamp}": "{price}",')
\ No newline at end of file
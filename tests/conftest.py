@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import each other and the votium package from votium/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "votium"))
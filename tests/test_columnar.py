@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+import pytest
+
+from votium import columnar
+from votium.pricing import scale_amount
+
+# Raw amounts past what a float64 holds exactly, with their token decimals
+AMOUNTS = [(2**53 + 1, 0), (2**200 + 12345, 18), (10**40 + 1, 6)]
+
+
+def exact_amounts():
+    return [scale_amount(amount, decimals) for amount, decimals in AMOUNTS]
+
+
+def price_amounts():
+    # As price_round writes them
+    return [format(amount, "f") for amount in exact_amounts()]
+
+
+def test_price_amounts_stay_exact():
+    kind = columnar.TYPES["price"].get("amount")
+    stored = columnar._convert(kind, price_amounts())
+    assert [Decimal(value) for value in stored] == exact_amounts()
+
+
+def test_price_amounts_round_trip_through_parquet(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(columnar, "ENABLED", True)
+    monkeypatch.setattr(columnar, "COLUMNAR_DIR", str(tmp_path))
+
+    columnar.write_round("price", 1, ["amount"], [[a] for a in price_amounts()])
+    stored = columnar.read_round("price", 1, columns=["amount"])["amount"].to_pylist()
+    assert [Decimal(value) for value in stored] == exact_amounts()
@@ -0,0 +1,126 @@
+import csv
+
+from votium import eventindex, eventstore, events
+
+HEADERS = ["_round", "_amount", "logIndex", "blockHash", "blockNumber"]
+
+
+def row(round, block):
+    return [str(round), str(block * 10), "0", f"0x{block:064x}", str(block)]
+
+
+def append(store, rows, scanned_from, block):
+    eventstore.append(
+        store, HEADERS, rows, scanned_from, {"block": block, "hash": f"0x{block:064x}"}, 0
+    )
+
+
+def test_checkpoint_advances_on_empty_ranges(tmp_path):
+    store = str(tmp_path / "store")
+    append(store, [row(1, 10)], 0, 50)
+    append(store, [], 51, 100)
+
+    manifest = eventstore.load_manifest(store)
+    assert manifest["checkpoint"]["block"] == 100
+    assert len(manifest["segments"]) == 1
+    assert eventstore.read_events(store) == [row(1, 10)]
+
+
+def test_rollback_rewrites_a_straddling_segment(tmp_path):
+    store = str(tmp_path / "store")
+    append(store, [row(1, 10), row(1, 20)], 0, 25)
+    append(store, [row(2, 30), row(2, 40), row(3, 50)], 26, 60)
+    append(store, [row(3, 70)], 61, 80)
+
+    eventstore.rollback(store, 45, {"block": 45, "hash": "0xabc"})
+
+    manifest = eventstore.load_manifest(store)
+    assert manifest["checkpoint"] == {"block": 45, "hash": "0xabc"}
+    assert [(s["start_block"], s["end_block"]) for s in manifest["segments"]] == [
+        (0, 25),
+        (26, 45),
+    ]
+    assert eventstore.read_events(store) == [row(1, 10), row(1, 20), row(2, 30), row(2, 40)]
+    assert list(eventstore.iter_round(store, 2)) == [row(2, 30), row(2, 40)]
+    assert list(eventstore.iter_round(store, 3)) == []
+    assert eventstore.last_event(store) == row(2, 40)
+    # Only the segments still in the manifest are left on disk
+    files = {p.name for p in tmp_path.joinpath("store").glob("segment_*")}
+    assert files == {s["file"] for s in manifest["segments"]}
+
+
+def test_import_legacy_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(eventstore, "SEGMENT_ROWS", 2)
+    legacy = tmp_path / "legacy.csv"
+    rows = [row(1, 10), row(1, 20), row(2, 30)]
+    with open(legacy, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+
+    store = str(tmp_path / "store")
+    eventstore.import_legacy_csv(store, str(legacy), round_column=0)
+
+    manifest = eventstore.load_manifest(store)
+    assert len(manifest["segments"]) == 2
+    assert manifest["checkpoint"] == {"block": 30, "hash": f"0x{30:064x}"}
+    assert eventstore.read_events(store) == rows
+    assert eventstore.get_max_round(store) == 2
+
+
+def test_check_reorg_rolls_back_to_a_canonical_event(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    append(store, [row(1, 10), row(1, 20)], 0, 25)
+    append(store, [row(2, 100), row(2, 110)], 26, 120)
+
+    # Blocks from 100 on were replaced by a reorg
+    def block_hash(block):
+        return f"0x{block:064x}" if block < 100 else f"0x{block + 1:064x}"
+
+    monkeypatch.setattr(events, "REORG_DEPTH", 8)
+    monkeypatch.setattr(events, "_block_hash", block_hash)
+    events._check_reorg(store)
+
+    manifest = eventstore.load_manifest(store)
+    assert manifest["checkpoint"]["block"] < 100
+    assert eventstore.read_events(store) == [row(1, 10), row(1, 20)]
+
+
+def test_check_reorg_keeps_a_canonical_checkpoint(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    append(store, [row(1, 10)], 0, 25)
+
+    monkeypatch.setattr(events, "_block_hash", lambda block: f"0x{block:064x}")
+    events._check_reorg(store)
+
+    assert eventstore.load_manifest(store)["checkpoint"]["block"] == 25
+    assert eventstore.read_events(store) == [row(1, 10)]
+
+
+def test_index_after_rewriting_a_rolled_back_range(tmp_path):
+    store = str(tmp_path / "store")
+    append(store, [row(1, 10)], 0, 100)
+    append(store, [row(2, 127)], 101, 200)
+    assert list(eventstore.iter_round(store, 2)) == [row(2, 127)]
+
+    # The same range is scanned again and now holds a same-sized row
+    eventstore.rollback(store, 100, {"block": 100, "hash": "0xabc"})
+    append(store, [row(2, 128)], 101, 200)
+    eventindex._open.clear()
+
+    index = eventstore.load_index(store)
+    assert index.select([2])["block"].tolist() == [128]
+    assert list(eventstore.iter_round(store, 2)) == [row(2, 128)]
+
+
+def test_index_selects_rounds_in_store_order(tmp_path):
+    store = str(tmp_path / "store")
+    # Rounds are not in store order, as late incentives for a round are allowed
+    append(store, [row(2, 10), row(1, 20), row(3, 30)], 0, 50)
+    append(store, [row(1, 60), row(2, 70)], 51, 100)
+    eventindex._open.clear()
+
+    index = eventstore.load_index(store)
+    assert index.select([1, 2])["block"].tolist() == [10, 20, 60, 70]
+    assert index.select(range(3, 5))["block"].tolist() == [30]
+    assert index.select([4]).tolist() == []
@@ -0,0 +1,27 @@
+import time
+
+from votium.executor import ThreadPool, run_rounds
+
+
+def work(round):
+    print(f"round {round} start")
+
+    def task(n):
+        # Later tasks finish first
+        time.sleep((3 - n) * 0.01)
+        print(f"round {round} task {n}")
+        return n
+
+    with ThreadPool(max_workers=3) as pool:
+        results = list(pool.map(task, range(3)))
+    print(f"round {round} end")
+    return results
+
+
+def test_nested_pool_output_stays_in_round_order(capsys):
+    assert run_rounds(work, [2, 1], workers=2) == {2: [0, 1, 2], 1: [0, 1, 2]}
+    assert capsys.readouterr().out.splitlines() == [
+        f"round {round} {line}"
+        for round in [2, 1]
+        for line in ["start", "task 0", "task 1", "task 2", "end"]
+    ]
@@ -0,0 +1,32 @@
+import os
+import stat
+
+from votium.files import write_csv, write_json
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_files_get_the_umask_mode(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        write_csv(tmp_path / "out.csv", ["a"], [[1]])
+        write_json(tmp_path / "out.json", {"a": 1})
+        with open(tmp_path / "plain.csv", "w"):
+            pass
+    finally:
+        os.umask(umask)
+
+    assert mode(tmp_path / "out.csv") == mode(tmp_path / "plain.csv")
+    assert mode(tmp_path / "out.json") == mode(tmp_path / "plain.csv")
+
+
+def test_rewrites_keep_the_existing_mode(tmp_path):
+    path = tmp_path / "out.csv"
+    write_csv(path, ["a"], [[1]])
+    os.chmod(path, 0o640)
+    write_csv(path, ["a"], [[2]])
+
+    assert mode(path) == 0o640
+    assert path.read_bytes() == b"a\r\n2\r\n"
@@ -0,0 +1,39 @@
+import pytest
+
+import follow
+
+
+class Stop(BaseException):
+    pass
+
+
+def test_follow_retries_after_errors(monkeypatch):
+    heads = iter([[1], ConnectionError("node down"), [2], [2], Stop()])
+
+    def fake_heads():
+        item = next(heads)
+        if isinstance(item, BaseException):
+            raise item
+        return iter(item)
+
+    updates = []
+
+    def update_live_rounds():
+        updates.append(len(updates))
+        if len(updates) == 1:
+            raise ValueError("Snapshot 502")
+
+    sleeps = []
+    monkeypatch.setattr(follow, "_heads", fake_heads)
+    monkeypatch.setattr(follow, "refresh_scores", lambda: None)
+    monkeypatch.setattr(follow, "get_last_round", lambda: 100)
+    monkeypatch.setattr(follow.incentives, "get_votium2_events", lambda: False)
+    monkeypatch.setattr(follow, "update_live_rounds", update_live_rounds)
+    monkeypatch.setattr(follow.time, "sleep", sleeps.append)
+
+    with pytest.raises(Stop):
+        follow.follow()
+
+    # The failed rebuild is retried once, and the delay resets after success
+    assert updates == [0, 1]
+    assert sleeps == [follow.RETRY_DELAY, follow.RETRY_DELAY * 2]
@@ -0,0 +1,41 @@
+import json
+
+from votium import gauges
+
+OLD = "0x" + "aa" * 20
+NEW = "0x" + "bb" * 20
+
+
+def make_registry(tmp_path, monkeypatch, fetched):
+    path = tmp_path / "gauges.json"
+    path.write_text(json.dumps({"gauges": {OLD: {"shortName": "old", "active": True}}}))
+    monkeypatch.setattr(gauges, "_fetch_curve_gauges", lambda: fetched)
+    return gauges.GaugeRegistry(str(path)).load(), path
+
+
+def test_refresh_only_adds_new_gauges(tmp_path, monkeypatch):
+    fetched = {
+        OLD.upper().replace("0X", "0x"): {"shortName": "renamed", "active": False},
+        NEW: {"shortName": "new", "active": True},
+    }
+    registry, path = make_registry(tmp_path, monkeypatch, fetched)
+
+    assert registry.refresh()
+    saved = json.loads(path.read_text())["gauges"]
+    assert saved == {
+        OLD: {"shortName": "old", "active": True},
+        NEW: {"shortName": "new", "active": True},
+    }
+    assert registry.name(OLD) == "old"
+    assert registry.name(NEW) == "new"
+
+
+def test_version_only_covers_the_given_gauges(tmp_path, monkeypatch):
+    registry, _ = make_registry(tmp_path, monkeypatch, {NEW: {"shortName": "new"}})
+    before = registry.version([OLD])
+    unknown = registry.version([OLD, NEW])
+
+    registry.refresh()
+    assert registry.version([OLD]) == before
+    assert registry.version([OLD.upper().replace("0X", "0x")]) == before
+    assert registry.version([OLD, NEW]) != unknown
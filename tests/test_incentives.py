@@ -0,0 +1,100 @@
+import incentives
+
+
+def fake_estimates(calls):
+    """estimate_block_times giving exact blocks 1000+n and the rest n."""
+
+    def estimate(w3, block_numbers, exact=()):
+        calls.append((set(block_numbers), set(exact)))
+        return {n: 1000 + n if n in exact else n for n in block_numbers}
+
+    return estimate
+
+
+def test_fast_block_times_keep_manual_price_blocks_exact(monkeypatch):
+    calls = []
+    monkeypatch.setattr(incentives, "FAST_BLOCK_TIMES", True)
+    monkeypatch.setattr(incentives, "BLOCK_TIME_MAP", {})
+    monkeypatch.setattr(incentives, "ESTIMATED_BLOCKS", set())
+    monkeypatch.setattr(incentives, "get_w3", lambda: None)
+    monkeypatch.setattr(incentives, "estimate_block_times", fake_estimates(calls))
+    monkeypatch.setattr(incentives, "get_manual_prices", lambda: {"ABC:1005": 1.0})
+    monkeypatch.setattr(
+        incentives, "TOKEN_MAP", {"0xa": ("ABC", "Abc", 18), "0xb": ("XYZ", "Xyz", 18)}
+    )
+
+    incentives.prefetch_block_times([1, 2])
+    assert incentives.BLOCK_TIME_MAP == {1: 1, 2: 2}
+
+    # A block seen first as an estimate is resolved again once it needs to be exact
+    exact = incentives.manual_price_blocks([("0xa", 2), ("0xb", 3)])
+    assert exact == {2}
+    incentives.prefetch_block_times([2, 3], exact=exact)
+    assert calls[-1] == ({2, 3}, {2})
+    assert incentives.BLOCK_TIME_MAP == {1: 1, 2: 1002, 3: 3}
+    assert incentives.ESTIMATED_BLOCKS == {1, 3}
+
+
+def test_block_time_mode_only_recorded_when_estimated(monkeypatch):
+    monkeypatch.setattr(incentives, "FAST_BLOCK_TIMES", False)
+    assert incentives.block_time_inputs({"events": "x"}) == {"events": "x"}
+    monkeypatch.setattr(incentives, "FAST_BLOCK_TIMES", True)
+    assert incentives.block_time_inputs({"events": "x"}) == {
+        "events": "x",
+        "block_times": "estimated",
+    }
+
+
+def test_events_v1_match_ids_with_or_without_prefix():
+    bribed_by_proposal = {"ab" * 32: [["bribe"]]}
+    for proposal_id in ["ab" * 32, "0x" + "ab" * 32]:
+        proposal_ids = {"1": proposal_id}
+        assert incentives._events_v1(1, proposal_ids, bribed_by_proposal) == [["bribe"]]
+
+
+def test_token_cache_metrics_count_each_token_once(monkeypatch):
+    counts = []
+    monkeypatch.setattr(incentives, "TOKEN_MAP", {"0xa": ("ABC", "Abc", 18)})
+
+    def cache(name, hits=0, misses=0):
+        counts.append((name, hits, misses))
+
+    monkeypatch.setattr(incentives.metrics, "cache", cache)
+
+    incentives.prefetch_tokens(["0xa", "0xa"])
+    for _ in range(3):
+        incentives.get_token("0xa")
+        incentives.get_token_decimals("0xa")
+    assert counts == [("token_map", 1, 0)]
+
+
+def test_unconfirmed_tokens_are_not_stored(monkeypatch):
+    from votium import tokens
+
+    class Store:
+        def __init__(self):
+            self.tokens = {}
+
+        def get_many(self, namespace, keys):
+            return {k: self.tokens[k] for k in keys if k in self.tokens}
+
+        def put_many(self, namespace, values):
+            self.tokens.update(values)
+
+    store = Store()
+    answers = [({"0xa": ("ABC", "Abc", 18), "0xb": ("UNKNOWN", "UNKNOWN", None)}, {"0xb"})]
+    answers.append(({"0xb": ("BCD", "Bcd", 6)}, set()))
+    monkeypatch.setattr(incentives, "TOKEN_MAP", {})
+    monkeypatch.setattr(incentives, "UNCONFIRMED_TOKENS", set())
+    monkeypatch.setattr(incentives, "get_store", lambda: store)
+    monkeypatch.setattr(incentives, "get_w3", lambda: None)
+    monkeypatch.setattr(tokens, "resolve_tokens", lambda w3, missing: answers.pop(0))
+
+    incentives.prefetch_tokens(["0xa", "0xb"])
+    assert store.tokens == {"0xa": ("ABC", "Abc", 18)}
+    assert not incentives.tokens_confirmed(["0xa", "0xb"])
+
+    incentives.prefetch_tokens(["0xa", "0xb"])
+    assert store.tokens["0xb"] == ("BCD", "Bcd", 6)
+    assert incentives.get_token("0xb") == ("BCD", "Bcd")
+    assert incentives.tokens_confirmed(["0xa", "0xb"])
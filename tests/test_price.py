@@ -0,0 +1,41 @@
+import price
+
+
+def incentive(symbol, timestamp):
+    return ["gauge", "1", symbol, str(timestamp), "0xtoken"]
+
+
+def test_prices_version_only_covers_the_round_manual_prices(monkeypatch):
+    manual_prices = {"ABC:100": "1.0", "XYZ:200": "2.0"}
+    monkeypatch.setattr(price, "get_manual_prices", lambda: manual_prices)
+    incentives = [incentive("ABC", 100), incentive("DEF", 100)]
+    before = price.prices_version(incentives)
+
+    manual_prices["XYZ:300"] = "3.0"
+    manual_prices["XYZ:200"] = "2.5"
+    assert price.prices_version(incentives) == before
+
+    manual_prices["ABC:100"] = "1.1"
+    assert price.prices_version(incentives) != before
+
+
+def test_rounds_with_missing_prices_are_rebuilt(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    row = ["gauge", "1000", "ABC", "100", "0xtoken", "Abc", "0xtx", "0xblock", "1", "5"]
+    prices = {("0xtoken", "100"): price.MISSING}
+    recorded = []
+    monkeypatch.setattr(price, "get_incentives", lambda round: [row])
+    monkeypatch.setattr(price, "get_snapshot", lambda round: [["gauge", 0, 5, 1.0]])
+    monkeypatch.setattr(price, "get_manual_prices", lambda: {})
+    monkeypatch.setattr(price, "get_prices", lambda lookups: dict(prices))
+    monkeypatch.setattr(price, "prefetch_tokens", lambda tokens: None)
+    monkeypatch.setattr(price, "get_token_decimals", lambda token: 18)
+    monkeypatch.setattr(price.builds, "needs_build", lambda *args: True)
+    monkeypatch.setattr(price.builds, "record", lambda *args: recorded.append(args))
+
+    price.price_round(1)
+    assert recorded == []
+
+    prices[("0xtoken", "100")] = 2.0
+    price.price_round(1)
+    assert [args[:2] for args in recorded] == [("price", 1)]
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from votium import provider
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, answer):
+        self.answer = answer
+        self.requests = []
+
+    def post(self, url, data, **kwargs):
+        payload = json.loads(data)
+        self.requests.append(payload)
+        return FakeResponse(self.answer(payload))
+
+
+def make_pool(monkeypatch, *answers):
+    monkeypatch.setattr(provider.time, "sleep", lambda seconds: None)
+    pool = provider.ProviderPool([f"http://node{n}" for n in range(len(answers))], rate_limit=0)
+    for endpoint, answer in zip(pool.endpoints, answers):
+        endpoint.session = FakeSession(answer)
+    return pool
+
+
+def batch_results(payload):
+    return [{"jsonrpc": "2.0", "id": call["id"], "result": call["id"]} for call in payload]
+
+
+def test_batch_fails_over_on_a_single_error_object(monkeypatch):
+    error = lambda payload: {"jsonrpc": "2.0", "id": None, "error": {"code": -32600}}
+    pool = make_pool(monkeypatch, error, batch_results)
+
+    assert pool.batch([("eth_chainId", []), ("eth_chainId", [])]) == [0, 1]
+    assert pool.endpoints[0].failures == 1
+
+
+def test_head_is_the_lowest_endpoint_head(monkeypatch):
+    head = lambda number: lambda payload: {"jsonrpc": "2.0", "id": 0, "result": hex(number)}
+    pool = make_pool(monkeypatch, head(120), head(100), head(130))
+    assert pool.head() == 100
+
+    def down(payload):
+        raise provider.requests.exceptions.ConnectionError("down")
+
+    pool = make_pool(monkeypatch, head(120), down)
+    assert pool.head() == 120
+    assert pool.endpoints[1].failures == 1
+
+    pool = make_pool(monkeypatch, down)
+    with pytest.raises(ConnectionError):
+        pool.head()
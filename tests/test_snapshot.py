@@ -0,0 +1,47 @@
+import re
+
+import snapshot
+
+
+def fake_graphql(proposals):
+    """A Snapshot endpoint ordering by created, with first/skip/created_gte."""
+
+    def graphql(query):
+        first = int(re.search(r"first: (\d+)", query).group(1))
+        skip = int(re.search(r"skip: (\d+)", query).group(1))
+        created_gte = int(re.search(r"created_gte: (\d+)", query).group(1))
+        matching = [p for p in proposals if p["created"] >= created_gte]
+        return {"data": {"proposals": matching[skip:skip + first]}}
+
+    return graphql
+
+
+def make_proposals(created):
+    return [
+        {"id": f"p{n}", "title": "Gauge Weight for", "start": 0, "end": 0, "created": c}
+        for n, c in enumerate(created)
+    ]
+
+
+def test_fetch_proposals_pages_without_repeats(monkeypatch):
+    proposals = make_proposals(range(100, 107))
+    monkeypatch.setattr(snapshot, "PAGE_SIZE", 2)
+    monkeypatch.setattr(snapshot, "_snapshot_graphql", fake_graphql(proposals))
+
+    assert snapshot._fetch_proposals(0) == proposals
+
+
+def test_fetch_proposals_pages_through_shared_timestamps(monkeypatch):
+    proposals = make_proposals([100, 101, 101, 101, 101, 101, 102, 103])
+    monkeypatch.setattr(snapshot, "PAGE_SIZE", 2)
+    monkeypatch.setattr(snapshot, "_snapshot_graphql", fake_graphql(proposals))
+
+    assert snapshot._fetch_proposals(0) == proposals
+
+
+def test_fetch_proposals_full_last_page(monkeypatch):
+    proposals = make_proposals([100, 100, 100, 100])
+    monkeypatch.setattr(snapshot, "PAGE_SIZE", 2)
+    monkeypatch.setattr(snapshot, "_snapshot_graphql", fake_graphql(proposals))
+
+    assert snapshot._fetch_proposals(0) == proposals
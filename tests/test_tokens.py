@@ -0,0 +1,45 @@
+from eth_abi import encode
+from web3.exceptions import ContractLogicError
+
+from votium import tokens
+
+
+class FakeEth:
+    def __init__(self, direct):
+        self.direct = direct
+
+    def call(self, tx):
+        answer = self.direct[(tx["to"], bytes.fromhex(tx["data"][2:]))]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+class FakeWeb3:
+    def __init__(self, direct):
+        self.eth = FakeEth(direct)
+
+
+def text(value):
+    return encode(["string"], [value])
+
+
+def test_only_reverts_count_as_unknown(monkeypatch):
+    answers = {
+        ("0xa", tokens.SYMBOL): None,
+        ("0xa", tokens.NAME): text("Abc"),
+        ("0xa", tokens.DECIMALS): encode(["uint8"], [18]),
+        ("0xb", tokens.SYMBOL): text("BCD"),
+        ("0xb", tokens.NAME): None,
+        ("0xb", tokens.DECIMALS): None,
+    }
+    direct = {
+        ("0xa", tokens.SYMBOL): ContractLogicError("execution reverted"),
+        ("0xb", tokens.NAME): text("Bcd"),
+        ("0xb", tokens.DECIMALS): ConnectionError("node down"),
+    }
+    monkeypatch.setattr(tokens, "aggregate", lambda w3, calls: [answers[c] for c in calls])
+
+    resolved, unconfirmed = tokens.resolve_tokens(FakeWeb3(direct), ["0xa", "0xb"])
+    assert resolved == {"0xa": (tokens.UNKNOWN, "Abc", 18), "0xb": ("BCD", "Bcd", None)}
+    assert unconfirmed == {"0xb"}
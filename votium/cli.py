@@ -0,0 +1,54 @@
+"""
+Single entry point for the scripts.
+
+    python votium/cli.py snapshot|incentives|price|all|follow|gauges|rounds
+
+Each command imports only the modules it needs when it runs, so read-only
+commands like rounds start without loading web3 or connecting to anything.
+"""
+
+import argparse
+import importlib
+
+
+def run_script(name):
+    """Run the main() of one of the scripts."""
+
+    importlib.import_module(name).main()
+
+
+def show_rounds():
+    """Print the current round and the latest round with incentives."""
+
+    from incentives import get_max_round_v2
+    from votium.rounds import get_last_round
+
+    print(f"Current round: {get_last_round()}")
+    print(f"Latest round with incentives: {get_max_round_v2()}")
+
+
+COMMANDS = {
+    "snapshot": ("Get the proposal and voting data from Snapshot", lambda: run_script("snapshot")),
+    "incentives": ("Get the incentives from Votium v1 and v2", lambda: run_script("incentives")),
+    "price": ("Merge and price the Snapshot and incentives data", lambda: run_script("price")),
+    "all": ("Run all three as one concurrent pipeline", lambda: run_script("pipeline")),
+    "follow": ("Keep the live rounds up to date", lambda: run_script("follow")),
+    "gauges": (
+        "Refresh the gauge list from the Curve API",
+        lambda: importlib.import_module("votium.gauges").refresh_gauges(),
+    ),
+    "rounds": ("Show the current and latest rounds", show_rounds),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, (help, _) in COMMANDS.items():
+        commands.add_parser(name, help=help)
+    args = parser.parse_args()
+    COMMANDS[args.command][1]()
+
+
+if __name__ == "__main__":
+    main()
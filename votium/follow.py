@@ -0,0 +1,157 @@
+"""
+Follow the chain tip and keep the live rounds up to date.
+
+Instead of rerunning the whole pipeline, this stays running. Every new block
+appends any new NewIncentive events, and the Snapshot scores of the live
+proposal are refetched every SCORES_INTERVAL seconds. Only the live rounds
+(the current round and any future round with incentives) are rebuilt, and
+only when their events or scores changed.
+
+New blocks are polled every POLL_INTERVAL seconds, or pushed through an
+eth_subscribe newHeads subscription if WEB3_WS_PROVIDER is set. Errors from
+the node or Snapshot are logged and the loop starts over after a backoff,
+picking up whatever work was left undone.
+"""
+
+import json
+import os
+import time
+
+import incentives
+import price
+import snapshot
+from votium import metrics
+from votium.rounds import get_last_round
+
+WEB3_WS_PROVIDER = os.environ.get("WEB3_WS_PROVIDER")
+POLL_INTERVAL = int(os.environ.get("VOTIUM_FOLLOW_POLL", "12"))
+SCORES_INTERVAL = int(os.environ.get("VOTIUM_SCORES_INTERVAL", "300"))
+
+# Seconds to wait after an error, doubled on each failure in a row
+RETRY_DELAY = 5
+MAX_RETRY_DELAY = 300
+
+
+def _polled_heads():
+    """Yield the tip block number every POLL_INTERVAL seconds."""
+
+    while True:
+        yield incentives.get_w3().eth.block_number
+        time.sleep(POLL_INTERVAL)
+
+
+def _subscribed_heads(url):
+    """
+    Yield block numbers as new heads arrive over a WebSocket subscription.
+
+    Yields None when no head arrived within POLL_INTERVAL, so the caller
+    still gets to refresh scores on time.
+    """
+
+    from websockets.sync.client import connect
+
+    with connect(url) as ws:
+        ws.send(
+            json.dumps(
+                {
+                    "jsonrpc": "2.0",
+                    "id": 1,
+                    "method": "eth_subscribe",
+                    "params": ["newHeads"],
+                }
+            )
+        )
+        response = json.loads(ws.recv())
+        if "error" in response:
+            raise ValueError(response["error"])
+        print(f"Subscribed to new heads on {url}")
+
+        while True:
+            try:
+                message = json.loads(ws.recv(timeout=POLL_INTERVAL))
+            except TimeoutError:
+                yield None
+                continue
+            yield int(message["params"]["result"]["number"], 16)
+
+
+def live_rounds() -> range:
+    """The current round and every future round with incentives so far."""
+
+    last_round = get_last_round()
+    max_round = incentives.get_max_round_v2() or last_round
+    return range(last_round, max(last_round, max_round) + 1)
+
+
+def refresh_scores():
+    """Refetch the proposal list and the scores of the live proposal."""
+
+    snapshot.get_snapshot_list(refresh=True)
+    snapshot.refresh_snapshots([get_last_round()])
+
+
+def update_live_rounds():
+    """Rebuild the incentives, then the prices, of live rounds that changed."""
+
+    rounds = live_rounds()
+    pending = incentives.pending_v2(rounds)
+    incentives.prefetch_v2(pending)
+    for round in pending:
+        incentives.process_round_v2(round)
+
+    # Future rounds have no proposal to price against yet, and neither has
+    # the current round until its proposal is listed
+    if snapshot.has_snapshot(rounds[0]):
+        price.price_round(rounds[0])
+    else:
+        print(f"Round {rounds[0]} has no proposal yet, not pricing it")
+    metrics.write_report()
+
+
+def _heads():
+    if WEB3_WS_PROVIDER:
+        return _subscribed_heads(WEB3_WS_PROVIDER)
+    return _polled_heads()
+
+
+def follow():
+    last_block = None
+    last_round = None
+    next_scores = 0
+    changed = False
+    delay = RETRY_DELAY
+    while True:
+        try:
+            for block in _heads():
+                if time.monotonic() >= next_scores or get_last_round() != last_round:
+                    refresh_scores()
+                    next_scores = time.monotonic() + SCORES_INTERVAL
+                    last_round = get_last_round()
+                    changed = True
+
+                if block is not None and block != last_block:
+                    if incentives.get_votium2_events():
+                        changed = True
+                    last_block = block
+
+                # Kept set until the rebuild succeeds, so a failed one is retried
+                if changed:
+                    update_live_rounds()
+                    changed = False
+                delay = RETRY_DELAY
+        except Exception as e:
+            print(f"Follow failed: {e!r}, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+
+def main():
+    print(f"Following live rounds (scores every {SCORES_INTERVAL}s)")
+    try:
+        follow()
+    except KeyboardInterrupt:
+        print("Stopped following")
+
+
+if __name__ == "__main__":
+    main()
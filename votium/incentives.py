@@ -1,16 +1,30 @@
-from dotenv import load_dotenv
-from snapshot import get_snapshot
-from votium.events import get_events
+from snapshot import (
+    get_snapshot,
+    has_snapshot,
+    prefetch_snapshots,
+    refresh_snapshots,
+    snapshot_version,
+)
+from votium.blocks import estimate_block_times, get_block_times
+from votium import builds, columnar, metrics
+from votium.gauges import get_registry
+from votium.events import (
+    get_events,
+    get_max_round,
+    index_events,
+    iter_round_events,
+    load_event_index,
+    read_event_headers,
+    sync_events,
+)
+from votium.executor import run_rounds
+from votium.files import write_csv
+from votium.kvstore import get_store
+from votium.llama import get_manual_prices
 from votium.rounds import get_last_round
-from web3 import Web3
 import csv
-import json
 import os
 
-load_dotenv()
-WEB3_HTTP_PROVIDER = os.environ.get("WEB3_HTTP_PROVIDER")
-w3 = Web3(Web3.HTTPProvider(WEB3_HTTP_PROVIDER))
-
 SNAPSHOT_LIST_FILE = "output/snapshot/snapshot_list.csv"
 SNAPSHOT_LIST_MAPPED_FILE = "output/incentives/snapshot_list_mapped.csv"
 
@@ -21,73 +35,167 @@ VOTIUM1_ABI = "data/abis/votium1.json"
 VOTIUM2_ADDRESS = "0x63942E31E98f1833A234077f47880A66136a2D1e"
 VOTIUM2_ABI = "data/abis/votium2.json"
 
-ERC20_ABI = "data/abis/erc20.json"
-
-GAUGES = "data/gauges.json"
+# Interpolate block timestamps instead of fetching every header. Timestamps
+# are then approximate except near round boundaries and for tokens with a
+# manual price, whose keys need the exact timestamp.
+FAST_BLOCK_TIMES = os.environ.get("VOTIUM_FAST_BLOCK_TIMES") == "1"
 
 OUTPUT_DIR = "output/incentives"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+INCENTIVE_HEADERS = [
+    "gauge",
+    "amount",
+    "token_symbol",
+    "timestamp",
+    "token_address",
+    "token_name",
+    "transaction_hash",
+    "block_hash",
+    "block_number",
+    "unadj_score",
+]
 
 # VOTIUM1_INCENTIVES = f"{OUTPUT_DIR}/votium1_incentives.csv"
 # VOTIUM2_INCENTIVES = f"{OUTPUT_DIR}/votium2_incentives.csv"
-VOTIUM2_EVENT_FILE = (
-    "cache/events/0x63942E31E98f1833A234077f47880A66136a2D1e-NewIncentive.csv"
-)
 
+# In-process views of the persistent token and block time caches
 TOKEN_MAP = {}
 BLOCK_TIME_MAP = {}
-GAUGE_MAP = {}
+# Blocks in BLOCK_TIME_MAP that may hold an interpolated timestamp
+ESTIMATED_BLOCKS = set()
+# Tokens in TOKEN_MAP whose metadata calls failed without a revert
+UNCONFIRMED_TOKENS = set()
+
+
+def get_w3():
+    """
+    Return the shared Web3 instance.
+
+    web3 and the provider pool are only set up on first use, so importing
+    this module to read the outputs stays cheap.
+    """
+
+    from votium.provider import get_web3
+
+    return get_web3()
+
+
+def prefetch_tokens(token_addresses) -> None:
+    """
+    Resolve metadata for all unseen tokens in a few Multicall3 requests.
+
+    The token_map cache metrics are counted here, once per token, and not
+    again by the per-row lookups that follow. Tokens whose calls failed
+    without a revert are not stored, and are resolved again next time.
+    """
+
+    token_addresses = list(dict.fromkeys(token_addresses))
+    missing = [t for t in token_addresses if t not in TOKEN_MAP or t in UNCONFIRMED_TOKENS]
+    metrics.cache("token_map", hits=len(token_addresses) - len(missing), misses=len(missing))
+    if not missing:
+        return
+
+    store = get_store()
+    stored = store.get_many("token", missing)
+    TOKEN_MAP.update(stored)
+    UNCONFIRMED_TOKENS.difference_update(stored)
+    resolved = len(missing)
+    missing = [t for t in missing if t not in stored]
+    metrics.cache("token_store", hits=resolved - len(missing), misses=len(missing))
+    if missing:
+        from votium.tokens import resolve_tokens
 
-with open(GAUGES) as f:
-    json = json.load(f)
-    for key, value in json["gauges"].items():
-        GAUGE_MAP[key] = value["shortName"]
+        print(f"Resolving metadata for {len(missing)} tokens")
+        tokens, unconfirmed = resolve_tokens(get_w3(), missing)
+        store.put_many("token", {t: v for t, v in tokens.items() if t not in unconfirmed})
+        TOKEN_MAP.update(tokens)
+        UNCONFIRMED_TOKENS.difference_update(tokens)
+        UNCONFIRMED_TOKENS.update(unconfirmed)
+        if unconfirmed:
+            print(f"Could not resolve {len(unconfirmed)} tokens, they will be retried")
+
+
+def tokens_confirmed(token_addresses) -> bool:
+    """Return whether the metadata of all the tokens is final."""
+
+    return UNCONFIRMED_TOKENS.isdisjoint(token_addresses)
 
 
 def get_token(token_address) -> tuple:
-    """Get the token name and symbol from the token address."""
+    """Get the token symbol and name from the token address."""
 
-    if token_address in TOKEN_MAP:
-        return TOKEN_MAP[token_address]
-    else:
-        erc20_contract = load_contract(ERC20_ABI, token_address)
-        token_symbol = erc20_contract.functions.symbol().call()  # type: ignore
-        token_name = erc20_contract.functions.name().call()  # type: ignore
-        TOKEN_MAP[token_address] = [token_symbol, token_name]
+    if token_address not in TOKEN_MAP:
+        prefetch_tokens([token_address])
+    token_symbol, token_name, _ = TOKEN_MAP[token_address]
+    return token_symbol, token_name
 
-        return token_symbol, token_name
 
+def get_token_decimals(token_address):
+    """Get the token decimals, or None if the token does not report them."""
 
-def get_block_time(block_number) -> int:
-    """Get the timestamp for a given block number."""
+    if token_address not in TOKEN_MAP:
+        prefetch_tokens([token_address])
+    return TOKEN_MAP[token_address][2]
 
-    if block_number in BLOCK_TIME_MAP:
-        return BLOCK_TIME_MAP[block_number]
+
+def prefetch_block_times(block_numbers, exact=()) -> None:
+    """
+    Resolve timestamps for all unseen blocks in batched requests.
+
+    With FAST_BLOCK_TIMES, blocks in exact still get their exact timestamp.
+    As with tokens, the cache metrics are counted here and not per row.
+    """
+
+    block_numbers = {int(n) for n in block_numbers}
+    exact = {int(n) for n in exact}
+    missing = (block_numbers - BLOCK_TIME_MAP.keys()) | (exact & ESTIMATED_BLOCKS)
+    metrics.cache(
+        "block_time_map", hits=len(block_numbers - missing), misses=len(missing)
+    )
+    if not missing:
+        return
+    if FAST_BLOCK_TIMES:
+        BLOCK_TIME_MAP.update(estimate_block_times(get_w3(), missing, exact=exact))
+        ESTIMATED_BLOCKS.difference_update(exact)
+        ESTIMATED_BLOCKS.update(missing - exact)
     else:
-        # print(block_number)
-        # print(type(block_number))
-        block = w3.eth.get_block(int(block_number))
-        # print(block)
-        timestamp = block["timestamp"]
-        BLOCK_TIME_MAP[block_number] = timestamp
-        return timestamp
+        BLOCK_TIME_MAP.update(get_block_times(get_w3(), missing))
+
 
+def manual_price_blocks(events) -> set:
+    """Return the blocks of (token, block) pairs whose token has a manual price."""
 
-def get_gauge_score(snapshot, gauge_address):
-    gauge_name = GAUGE_MAP[gauge_address]
-    if snapshot is not None:
-        for choice in snapshot:
-            if choice[0] == gauge_name:
-                return gauge_name, choice[2]
+    symbols = {key.split(":")[0] for key in get_manual_prices()}
+    return {
+        int(block) for token, block in events if TOKEN_MAP[token][0] in symbols
+    }
 
-    return gauge_name, 0
 
+def block_time_inputs(inputs) -> dict:
+    """Add the block time mode to a round's inputs when it is not exact."""
 
-def load_contract(abi, address) -> object:
-    with open(abi) as f:
-        abi = f.read()
-    contract = w3.eth.contract(address=address, abi=abi)
-    return contract
+    # Only recorded when set, so exact-mode records stay as they were
+    if FAST_BLOCK_TIMES:
+        inputs["block_times"] = "estimated"
+    return inputs
+
+
+def get_block_time(block_number) -> int:
+    """Get the timestamp for a given block number."""
+
+    block_number = int(block_number)
+    if block_number in BLOCK_TIME_MAP:
+        return BLOCK_TIME_MAP[block_number]
+    metrics.cache("block_time_map", misses=1)
+
+    store = get_store()
+    timestamp = store.get("block_time", str(block_number))
+    if timestamp is None:
+        block = get_w3().eth.get_block(block_number)
+        timestamp = block["timestamp"]
+        store.put("block_time", str(block_number), timestamp)
+    BLOCK_TIME_MAP[block_number] = timestamp
+    return timestamp
 
 
 def get_snapshot_list_map() -> list:
@@ -119,9 +227,9 @@ def get_snapshot_list_map() -> list:
     for snapshot in snapshot_list:
         snapshot_id = snapshot[3]
         if snapshot_id.startswith("0x"):
-            keccak_id = w3.keccak(hexstr=snapshot_id)
+            keccak_id = get_w3().keccak(hexstr=snapshot_id)
         else:
-            keccak_id = w3.keccak(text=snapshot_id)
+            keccak_id = get_w3().keccak(text=snapshot_id)
         snapshot_list_map.append(
             [
                 snapshot[0],
@@ -133,27 +241,32 @@ def get_snapshot_list_map() -> list:
             ]
         )
 
-    with open(SNAPSHOT_LIST_MAPPED_FILE, "w") as f:
-        writer = csv.writer(f)
-        writer.writerow(
-            [
-                "round",
-                "start",
-                "end",
-                "id",
-                "title",
-                "keccak_id",
-            ]
-        )
-        writer.writerows(snapshot_list_map)
+    write_csv(
+        SNAPSHOT_LIST_MAPPED_FILE,
+        [
+            "round",
+            "start",
+            "end",
+            "id",
+            "title",
+            "keccak_id",
+        ],
+        snapshot_list_map,
+    )
 
     return snapshot_list_map
 
 
+def incentives_file(round) -> str:
+    """Return the incentive CSV path for a round."""
+
+    return f"{OUTPUT_DIR}/round_{round:03d}_incentives.csv"
+
+
 def get_incentives(round) -> list:
     """Get the incentives for a given round."""
 
-    file_path = f"{OUTPUT_DIR}/round_{round:03d}_incentives.csv"
+    file_path = incentives_file(round)
     if os.path.exists(file_path):
         with open(file_path, "r") as f:
             reader = csv.reader(f)
@@ -164,148 +277,236 @@ def get_incentives(round) -> list:
         return None
 
 
+def index_v1(snapshot_list_map, bribed) -> tuple:
+    """
+    Index the v1 inputs for O(1) per-round access.
+
+    Returns ({round: keccak proposal id}, {proposal id: [Bribed events]}).
+    """
+
+    proposal_ids = {}
+    for p in snapshot_list_map:
+        proposal_ids.setdefault(p[0], p[5])
+    return proposal_ids, index_events(bribed, 0)
+
+
+def inputs_v1(round, events) -> dict:
+    """Fingerprint the inputs of a Votium v1 round's incentive file."""
+
+    return block_time_inputs(
+        {
+            "events": builds.fingerprint(events),
+            "snapshot": snapshot_version(round),
+        }
+    )
+
+
+def _events_v1(round, proposal_ids, bribed_by_proposal) -> list:
+    # Older mapped files have the ids with a 0x prefix
+    return bribed_by_proposal.get(proposal_ids[str(round)].removeprefix("0x"), [])
+
+
+@metrics.stage("incentives")
+def process_round_v1(round, proposal_ids, bribed_by_proposal):
+    """Create the incentive CSV for a Votium v1 round from Bribed events."""
+
+    file_path = incentives_file(round)
+    print(f"Processing round {round} incentives in {file_path}")
+    proposal = get_snapshot(round)
+    events = _events_v1(round, proposal_ids, bribed_by_proposal)
+    incentives = []
+    for e in events:
+        choice_index = int(e[3])
+        gauge = proposal[choice_index][0]
+        token_address = e[1]
+        token_symbol, token_name = get_token(token_address)
+        amount = e[2]
+        transaction_hash = e[7]
+        block_hash = e[9]
+        block_number = e[10]
+        timestamp = get_block_time(block_number)
+        score = proposal[choice_index][2]
+        incentives.append(
+            [
+                gauge,
+                amount,
+                token_symbol,
+                timestamp,
+                token_address,
+                token_name,
+                transaction_hash,
+                block_hash,
+                block_number,
+                score,
+            ]
+        )
+
+    # Save as CSV
+    write_csv(file_path, INCENTIVE_HEADERS, incentives)
+    columnar.write_round("incentives", round, INCENTIVE_HEADERS, incentives)
+    columnar.write_round(
+        "events/Bribed",
+        round,
+        read_event_headers(VOTIUM1_ADDRESS, "Bribed"),
+        events,
+    )
+    # Rounds using tokens that could not be resolved are built again later
+    if tokens_confirmed(e[1] for e in events):
+        builds.record("incentives", round, inputs_v1(round, events))
+    metrics.rows("incentives", len(incentives))
+
+
+def pending_v1(proposal_ids, bribed_by_proposal) -> list:
+    """Return the v1 rounds whose incentive file is missing or out of date."""
+
+    return [
+        round
+        for round in range(1, 53)
+        if builds.needs_build(
+            "incentives",
+            round,
+            inputs_v1(round, _events_v1(round, proposal_ids, bribed_by_proposal)),
+            incentives_file(round),
+        )
+    ]
+
+
+def prefetch_v1(rounds, proposal_ids, bribed_by_proposal):
+    """Resolve tokens and block times for the v1 rounds that need processing."""
+
+    events = [
+        e for round in rounds for e in _events_v1(round, proposal_ids, bribed_by_proposal)
+    ]
+    prefetch_tokens(b[1] for b in events)
+    exact = manual_price_blocks((b[1], b[10]) for b in events) if FAST_BLOCK_TIMES else ()
+    prefetch_block_times((b[10] for b in events), exact=exact)
+
+
 def process_incentive_events_v1(snapshot_list_map, initiated, bribed):
-    for round in range(1, 53):
-        # Check if output already exists
-        file_path = f"{OUTPUT_DIR}/round_{round:03d}_incentives.csv"
-        if os.path.exists(file_path):
-            print(f"Using cached {file_path}")
-            continue
-
-        print(f"Processing round {round} incentives in {file_path}")
-        proposal = get_snapshot(round)
-        proposal_id = [p for p in snapshot_list_map if p[0] == str(round)][0][5]
-        events = [b for b in bribed if b[0] == proposal_id[2:]]
-        incentives = []
-        for e in events:
-            choice_index = int(e[3])
-            gauge = proposal[choice_index][0]
-            token_address = e[1]
-            token_symbol, token_name = get_token(token_address)
-            amount = e[2]
-            transaction_hash = e[7]
-            block_hash = e[9]
-            block_number = e[10]
-            timestamp = get_block_time(block_number)
-            score = proposal[choice_index][2]
-            incentives.append(
-                [
-                    gauge,
-                    amount,
-                    token_symbol,
-                    timestamp,
-                    token_address,
-                    token_name,
-                    transaction_hash,
-                    block_hash,
-                    block_number,
-                    score,
-                ]
-            )
-
-        # Save as CSV
-        with open(file_path, "w") as f:
-            writer = csv.writer(f)
-            writer.writerow(
-                [
-                    "gauge",
-                    "amount",
-                    "token_symbol",
-                    "timestamp",
-                    "token_address",
-                    "token_name",
-                    "transaction_hash",
-                    "block_hash",
-                    "block_number",
-                    "unadj_score",
-                ]
-            )
-            writer.writerows(incentives)
+    proposal_ids, bribed_by_proposal = index_v1(snapshot_list_map, bribed)
+
+    prefetch_snapshots(range(1, 53))
+    pending = pending_v1(proposal_ids, bribed_by_proposal)
+    prefetch_v1(pending, proposal_ids, bribed_by_proposal)
+    run_rounds(
+        lambda round: process_round_v1(round, proposal_ids, bribed_by_proposal),
+        pending,
+    )
 
 
-def process_incentive_events_v2():
-    """Create incentive CSV files based on Votium v2 NewIncentive."""
+def inputs_v2(round, events) -> dict:
+    """Fingerprint the inputs of a Votium v2 round's incentive file."""
 
-    with open(VOTIUM2_EVENT_FILE) as f:
-        reader = csv.reader(f)
-        next(reader)
-        incentives = list(reader)
+    return block_time_inputs(
+        {
+            "events": builds.fingerprint(events),
+            "snapshot": snapshot_version(round),
+            "gauges": get_registry().version(e[1] for e in events),
+        }
+    )
 
-    # Get the max round in the incentives file
-    max_round = max(
-        [int(row[0]) for row in incentives]
-    )  # Assuming _round is in the first column
-    print(f"Max round: {max_round}")
 
-    # Process the incentives for each round
-    for round in range(53, max_round + 1):
-        file_path = f"{OUTPUT_DIR}/round_{round:03d}_incentives.csv"
+def _events_v2(round) -> list:
+    return list(iter_round_events(VOTIUM2_ADDRESS, "NewIncentive", round))
 
-        if os.path.exists(file_path):
-            print(f"Using cached {file_path}")
-            continue
 
-        print(f"Processing round {round} to {file_path}")
-        last_round = get_last_round()
-        if round < int(last_round) + 1:
-            snapshot = get_snapshot(round)
-        else:
-            snapshot = None
-        # Filter to relevant events for the round
-        events = [e for e in incentives if e[0] == str(round)]
-        round_incentives = []
-        for event in events:
-            gauge, score = get_gauge_score(snapshot, event[1])
-            token_symbol, token_name = get_token(event[4])
-            round_incentives.append(
-                [
-                    gauge,  # gauge
-                    event[5],  # amount
-                    token_symbol,  # token_symbol
-                    get_block_time(event[15]),  # timestamp
-                    event[4],  # token_address
-                    token_name,  # token_name
-                    event[12],  # transaction_hash
-                    event[14],  # block_hash
-                    event[15],  # block_number
-                    score,  # unadj_score
-                ]
-            )
-        with open(file_path, "w") as f:
-            writer = csv.writer(f)
-            writer.writerow(
-                [
-                    "gauge",
-                    "amount",
-                    "token_symbol",
-                    "timestamp",
-                    "token_address",
-                    "token_name",
-                    "transaction_hash",
-                    "block_hash",
-                    "block_number",
-                    "unadj_score",
-                ]
-            )
-            writer.writerows(round_incentives)
+@metrics.stage("incentives")
+def process_round_v2(round):
+    """Create the incentive CSV for a Votium v2 round from NewIncentive events."""
 
+    file_path = incentives_file(round)
+    print(f"Processing round {round} to {file_path}")
+    last_round = get_last_round()
+    # Right after a round starts its proposal may not be listed yet. The round
+    # is then built like a future one and rebuilt when the proposal shows up,
+    # as that changes its snapshot input.
+    if round < int(last_round) + 1 and has_snapshot(round):
+        snapshot = get_snapshot(round)
+    else:
+        snapshot = None
+    events = _events_v2(round)
+    gauges = get_registry().for_round(snapshot)
+    round_incentives = []
+    for event in events:
+        gauge, score = gauges.score(event[1])
+        token_symbol, token_name = get_token(event[4])
+        round_incentives.append(
+            [
+                gauge,  # gauge
+                event[5],  # amount
+                token_symbol,  # token_symbol
+                get_block_time(event[15]),  # timestamp
+                event[4],  # token_address
+                token_name,  # token_name
+                event[12],  # transaction_hash
+                event[14],  # block_hash
+                event[15],  # block_number
+                score,  # unadj_score
+            ]
+        )
+    write_csv(file_path, INCENTIVE_HEADERS, round_incentives)
+    columnar.write_round("incentives", round, INCENTIVE_HEADERS, round_incentives)
+    columnar.write_round(
+        "events/NewIncentive",
+        round,
+        read_event_headers(VOTIUM2_ADDRESS, "NewIncentive"),
+        events,
+    )
+    # Rounds using tokens that could not be resolved are built again later
+    if tokens_confirmed(event[4] for event in events):
+        builds.record("incentives", round, inputs_v2(round, events))
+    metrics.rows("incentives", len(round_incentives))
 
-def main():
-    """Get the incentives for all rounds."""
 
-    # TODO Delete incentive cache files for the current round and beyond
-    current_round = get_last_round()
-    print(f"Current round: {current_round}")
-    cache_files = os.listdir(OUTPUT_DIR)
-    for f in cache_files:
-        if f.startswith("round_") and f.endswith("_incentives.csv"):
-            round = int(f.split("_")[1])
-            if round >= int(current_round):
-                print(f"Deleting {f}")
-                os.remove(f"{OUTPUT_DIR}/{f}")
+def get_max_round_v2() -> int:
+    """Return the highest round with a NewIncentive event."""
 
-    print("Mapping all Snapshot proposal IDs to Event proposal IDs")
-    snapshot_list_map = get_snapshot_list_map()
+    return get_max_round(VOTIUM2_ADDRESS, "NewIncentive")
+
+
+def pending_v2(rounds=None) -> list:
+    """Return the v2 rounds whose incentive file is missing or out of date."""
+
+    if rounds is None:
+        rounds = range(53, get_max_round_v2() + 1)
+    return [
+        round
+        for round in rounds
+        if builds.needs_build(
+            "incentives", round, inputs_v2(round, _events_v2(round)), incentives_file(round)
+        )
+    ]
+
+
+def prefetch_v2(rounds):
+    """Resolve tokens and block times for the v2 rounds that need processing."""
+
+    index = load_event_index(VOTIUM2_ADDRESS, "NewIncentive")
+    records = index.select(rounds)
+    prefetch_tokens(index.token_addresses(records))
+    blocks = records["block"].tolist()
+    exact = ()
+    if FAST_BLOCK_TIMES:
+        tokens = [index.tokens[i] for i in records["token"].tolist()]
+        exact = manual_price_blocks(zip(tokens, blocks))
+    prefetch_block_times(blocks, exact=exact)
+
+
+def process_incentive_events_v2():
+    """Create incentive CSV files based on Votium v2 NewIncentive."""
+
+    # Get the max round in the incentives file
+    max_round = get_max_round_v2()
+    print(f"Max round: {max_round}")
+
+    prefetch_snapshots(range(53, get_last_round() + 1))
+    pending = pending_v2()
+    prefetch_v2(pending)
+    run_rounds(process_round_v2, pending)
+
+
+def get_votium1_events():
+    """Get the Initiated and Bribed events from Votium v1."""
 
     print("Getting all Initiated events from Votium v1")
     initiated = get_events(
@@ -325,19 +526,43 @@ def main():
         end_block=18043767 + 20000,  # 10K past starting block for Votium v2
     )
 
-    process_incentive_events_v1(snapshot_list_map, initiated, bribed)
+    return initiated, bribed
+
+
+def get_votium2_events() -> int:
+    """Get the NewIncentive events from Votium v2 and return how many were new."""
 
     print("Getting all NewIncentive events from Votium v2")
-    new_incentives = get_events(
+    return sync_events(
         VOTIUM2_ABI,
         VOTIUM2_ADDRESS,
         "NewIncentive",
         start_block=18043767,  # Starting block for Votium v2
-        end_block=w3.eth.block_number,
+        end_block=get_w3().eth.block_number,
+        round_column=0,
     )
 
+
+def main():
+    """Get the incentives for all rounds."""
+
+    # Scores for open proposals are refetched. Rounds whose events, scores
+    # or gauge map changed are rebuilt below.
+    refresh_snapshots(range(1, get_last_round() + 1))
+
+    print("Mapping all Snapshot proposal IDs to Event proposal IDs")
+    snapshot_list_map = get_snapshot_list_map()
+
+    initiated, bribed = get_votium1_events()
+
+    process_incentive_events_v1(snapshot_list_map, initiated, bribed)
+
+    get_votium2_events()
+
     process_incentive_events_v2()
 
+    metrics.write_report()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+"""
+Run snapshot -> incentives -> price as one concurrent pipeline.
+
+Each stage runs its blocking work on worker threads and streams finished
+rounds to the next stage through a bounded queue, so a slow stage holds back
+the stages before it instead of letting work pile up. The chain event
+backfills run alongside the Snapshot stage, and a full rebuild is limited by
+the slowest upstream rather than the sum of every request.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+
+import incentives
+import price
+import snapshot
+from votium import metrics
+from votium.rounds import get_last_round
+
+WORKERS = int(os.environ.get("VOTIUM_PIPELINE_WORKERS", "4"))
+QUEUE_SIZE = 8
+
+# Queue sentinel marking the end of a stage's input
+DONE = None
+
+
+async def _stage(fn, inbox, outbox, workers):
+    """Run fn on each round from inbox with workers, passing rounds on."""
+
+    async def worker():
+        while True:
+            round = await inbox.get()
+            if round is DONE:
+                # Let the sibling workers see the sentinel too
+                await inbox.put(DONE)
+                return
+            await fn(round)
+            if outbox is not None:
+                await outbox.put(round)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    if outbox is not None:
+        await outbox.put(DONE)
+
+
+async def _load_v1():
+    snapshot_list_map = await asyncio.to_thread(incentives.get_snapshot_list_map)
+    _, bribed = await asyncio.to_thread(incentives.get_votium1_events)
+    proposal_ids, bribed_by_proposal = incentives.index_v1(snapshot_list_map, bribed)
+    pending = await asyncio.to_thread(
+        incentives.pending_v1, proposal_ids, bribed_by_proposal
+    )
+    await asyncio.to_thread(
+        incentives.prefetch_v1, pending, proposal_ids, bribed_by_proposal
+    )
+    return proposal_ids, bribed_by_proposal, set(pending)
+
+
+async def _load_v2():
+    await asyncio.to_thread(incentives.get_votium2_events)
+    pending = await asyncio.to_thread(incentives.pending_v2)
+    await asyncio.to_thread(incentives.prefetch_v2, pending)
+    return set(pending)
+
+
+async def run(workers: int = WORKERS):
+    """Rebuild every round, streaming each through all three stages."""
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers * 4))
+
+    print("Getting list from Snapshot")
+    await asyncio.to_thread(snapshot.get_snapshot_list)
+    await asyncio.to_thread(
+        snapshot.refresh_snapshots, range(1, get_last_round() + 1)
+    )
+
+    v1 = asyncio.create_task(_load_v1())
+    v2 = asyncio.create_task(_load_v2())
+
+    async def snapshot_round(round):
+        await asyncio.to_thread(snapshot.get_snapshot, round)
+
+    async def incentives_round(round):
+        # Rounds that are up to date were left out of the pending sets
+        if round < 53:
+            proposal_ids, bribed_by_proposal, pending = await v1
+            if round in pending:
+                await asyncio.to_thread(
+                    incentives.process_round_v1, round, proposal_ids, bribed_by_proposal
+                )
+        elif round in await v2:
+            await asyncio.to_thread(incentives.process_round_v2, round)
+
+    async def price_round(round):
+        print(f"Pricing round {round}")
+        await asyncio.to_thread(price.price_round, round)
+
+    snapshots = asyncio.Queue(QUEUE_SIZE)
+    incentive_rounds = asyncio.Queue(QUEUE_SIZE)
+    price_rounds = asyncio.Queue(QUEUE_SIZE)
+
+    async def produce():
+        for round in range(1, get_last_round() + 1):
+            await snapshots.put(round)
+        await snapshots.put(DONE)
+
+    await asyncio.gather(
+        produce(),
+        _stage(snapshot_round, snapshots, incentive_rounds, workers),
+        _stage(incentives_round, incentive_rounds, price_rounds, workers),
+        _stage(price_round, price_rounds, None, workers),
+    )
+
+    # Incentives already posted for future rounds have no snapshot or price yet
+    await v1
+    await v2
+    max_round = incentives.get_max_round_v2()
+    for round in range(get_last_round() + 1, max_round + 1):
+        await incentives_round(round)
+
+
+def main():
+    asyncio.run(run())
+    metrics.write_report()
+
+
+if __name__ == "__main__":
+    main()
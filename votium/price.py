@@ -1,70 +1,80 @@
 import csv
-import os
-from collections import defaultdict
 
-import requests
-from incentives import get_incentives
+from incentives import (
+    get_incentives,
+    get_token_decimals,
+    incentives_file,
+    prefetch_tokens,
+    tokens_confirmed,
+)
 
 # from incentives import main as incentives_main
-from snapshot import get_snapshot
+from snapshot import get_snapshot, prefetch_snapshots
 
-from votium.rounds import get_current_round, get_last_round
+from votium import builds, columnar, metrics
+from votium.executor import run_rounds
+from votium.files import write_csv
+from votium.llama import ERROR, MISSING, get_manual_prices, get_prices, seed_prices
+from votium.rounds import get_last_round
 
 OUTPUT_DIR = "output/price"
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-
-# Tokens that are missing / need to use coingecko
-MANUAL_PRICES = {
-    "USDM:1634232288": "1.0",
-    "USDM:1635553502": "1.0",
-    "LUNA:1638166693": "49.97057261602858",
-    "LUNA:1639194085": "61.032431508730056",
-    "LUNA:1640219788": "85.53254278439978",
-    "LUNA:1640219878": "85.53254278439978",
-    "LUNA:1641603266": "68.88043797219528",
-    "LUNA:1642820274": "64.39269522104948",
-    "LUNA:1642933760": "62.60645063584536",
-    "T:1643032930": "0.08858019868648463",
-    "LUNA:1643856451": "47.722832144087256",
-    "LUNA:1644191725": "55.48483663183234",
-    "LUNA:1645316587": "50.50251006449115",
-    "LUNA:1645320009": "50.50251006449115",
-    "APEFI:1670471615": "0.003379061468807522",
-    "sdFXS:1681663955": "10.246017123185558",
-    "sdFXS:1691400455": "6.475601695530601",
-    "sdFXS:1692603575": "6.04753134843985",
-    "sdFXS:1693817279": "5.422331650380933",
-    "xETH:1705845467": "1.32",
-    "xETH:1709526839": "2.77",
-    "SPELL:1711647035": "0.00126146",
-    "ALCX:1711698179": "34.33",
-    "TXJP:1712817803": "80.72",
-    "FXS:1713139895": "5.16",
-    "FXS:1713163667": "5.16",
-    "FXS:1713164243": "5.16",
-    "FXS:1713165731": "5.16",
-    "FXS:1713201047": "4.92",
-    "TXJP:1714020371": "81.22",
-    "TXJP:1715315723": "68.77",
-    "TXJP:1716684239": "83.52",
-    "sdFXS:1717853147": "4.54",
-    "TXJP:1717900079": "79.75",
-    "TXJP:1719030383": "71.49",
-    "TXJP:1720253579": "60.01",
-    "TXJP:1721553731": "70.64",
-}
 
+PRICE_HEADERS = [
+    "gauge",
+    "amount",
+    "token_symbol",
+    "token_price",
+    "usd_value",
+    "score",
+    "token",
+    "token_name",
+    "per_vote",
+    "transaction_hash",
+    "block_hash",
+    "block_number",
+]
 
+def prices_version(incentives) -> str:
+    """Fingerprint of the manual prices a round's incentives use, for the build records."""
+
+    manual_prices = get_manual_prices()
+    keys = {f"{i[2]}:{i[3]}" for i in incentives}
+    return builds.fingerprint({k: manual_prices[k] for k in keys if k in manual_prices})
+
+
+def get_decimals(token_address, token_symbol) -> int:
+    """Get the token decimals, falling back on known symbols."""
+
+    decimals = get_token_decimals(token_address)
+    if decimals is not None:
+        return decimals
+    if token_symbol in ["USDC", "UST", "LUNA", "PYUSD"]:
+        return 6
+    elif token_symbol in ["EURS"]:
+        return 2
+    return 18
+
+
+def round_inputs(round, incentives) -> dict:
+    """Fingerprint the inputs of a round's price file."""
+
+    return {
+        "incentives": builds.file_fingerprint(incentives_file(round)),
+        "prices": prices_version(incentives or []),
+    }
+
+
+@metrics.stage("price")
 def price_round(round):
     """Get a round"""
 
     file_path = f"{OUTPUT_DIR}/round_{round:03d}_price.csv"
-    if os.path.exists(file_path):
+    incentives = get_incentives(round)
+    inputs = round_inputs(round, incentives)
+    if not builds.needs_build("price", round, inputs, file_path):
         with open(file_path, "r") as f:
             reader = csv.reader(f)
             next(reader)
-            print(f"Using {file_path} as it already exists")
             return list(reader)
 
     snapshot = get_snapshot(round)
@@ -73,30 +83,33 @@ def price_round(round):
     total_score = sum([x[2] for x in snapshot])
     print(f"Total score in snapshot: {total_score}")
 
-    incentives = get_incentives(round)
-
-    # Get the votes and adjust split across gauges
-    # Get the number of incentive deposits for each gauge
-    incentive_deposits = defaultdict(int)
-    for i in incentives:
-        # gauge,amount,token_symbol,timestamp,token_address,token_name,transaction_hash,block_hash,block_number,unadj_score
-        (
-            gauge,
-            amount,
-            token_symbol,
-            timestamp,
-            token_address,
-            token_name,
-            transaction_hash,
-            block_hash,
-            block_number,
-            unadj_score,
-        ) = i
-        incentive_deposits[gauge] += 1
+    # Seed the price store with manual prices, then price the whole round
+    manual_prices = get_manual_prices()
+    seed_prices(
+        {
+            (i[4], i[3]): manual_prices[f"{i[2]}:{i[3]}"]
+            for i in incentives
+            if f"{i[2]}:{i[3]}" in manual_prices
+        }
+    )
+    round_prices = get_prices((i[4], i[3]) for i in incentives)
+
+    # Scale by real token decimals and split votes across gauge deposits
+    from votium.pricing import price_incentives
+
+    prefetch_tokens(i[4] for i in incentives)
+    token_prices = [round_prices[(i[4], i[3])] for i in incentives]
+    amounts, scores, usd_values, per_votes = price_incentives(
+        gauges=[i[0] for i in incentives],
+        amounts=[i[1] for i in incentives],
+        decimals=[get_decimals(i[4], i[2]) for i in incentives],
+        prices=token_prices,
+        unadj_scores=[i[9] for i in incentives],
+    )
 
     prices = []
     total_score = 0
-    for i in incentives:
+    for n, i in enumerate(incentives):
         (
             gauge,
             amount,
@@ -110,56 +123,27 @@ def price_round(round):
             unadj_score,
         ) = i
 
-        if token_symbol in ["USDC", "UST", "LUNA", "PYUSD"]:
-            amount = float(amount) / 1e6
-        elif token_symbol in ["EURS"]:
-            amount = float(amount) / 1e2
-        else:
-            amount = float(amount) / 1e18
-
-        # Get votes for the gauge
-        if unadj_score == 0:
-            score = 0.0
+        price = token_prices[n]
+        if price == MISSING:
+            print(f"{round}-{gauge}: Missing {token_symbol} {timestamp}")
+            usd_value = MISSING
+            per_vote = MISSING
+        elif price == ERROR:
+            print(f"{round}-{gauge}: Error")
+            usd_value = ERROR
+            per_vote = ERROR
         else:
-            score = float(unadj_score) / incentive_deposits[gauge]
-
-        # Check / get price from manual prices
-        if f"{token_symbol}:{timestamp}" in MANUAL_PRICES:
-            price = MANUAL_PRICES[f"{token_symbol}:{timestamp}"]
-            usd_value = float(amount) * float(price)
-            per_vote = usd_value / score if score != 0 else 0
-
-        else:
-            # Get price from defillama
-            url = f"https://coins.llama.fi/prices/historical/{timestamp}/ethereum:{token_address}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                json = response.json()
-                if "coins" in json and f"ethereum:{token_address}" in json["coins"]:
-                    price = response.json()["coins"][f"ethereum:{token_address}"][
-                        "price"
-                    ]
-                    usd_value = float(amount) * float(price)
-                    per_vote = usd_value / score if score != 0 else 0
-                else:
-                    print(f"{round}-{gauge}: Missing {token_symbol} {timestamp}")
-                    price = "MISSING"
-                    usd_value = "MISSING"
-                    per_vote = "MISSING"
-            else:
-                print(f"{round}-{gauge}: Error {response.status_code}")
-                price = "ERROR"
-                usd_value = "ERROR"
-                per_vote = "ERROR"
+            usd_value = float(usd_values[n])
+            per_vote = float(per_votes[n])
 
         prices.append(
             [
                 gauge,
-                amount,
+                format(amounts[n], "f"),
                 token_symbol,
                 price,
                 usd_value,
-                score,
+                float(scores[n]),
                 token_address,
                 token_name,
                 per_vote,
@@ -170,46 +154,34 @@ def price_round(round):
         )
 
     # Save to CSV file
-    with open(file_path, "w") as f:
-        writer = csv.writer(f)
-        writer.writerow(
-            [
-                "gauge",
-                "amount",
-                "token_symbol",
-                "token_price",
-                "usd_value",
-                "score",
-                "token",
-                "token_name",
-                "per_vote",
-                "transaction_hash",
-                "block_hash",
-                "block_number",
-            ]
-        )
-        writer.writerows(prices)
+    write_csv(file_path, PRICE_HEADERS, prices)
+    columnar.write_round("price", round, PRICE_HEADERS, prices)
+    metrics.rows("price", len(prices))
+
+    # Leave rounds with failed or missing lookups unrecorded so they are
+    # retried, once the price store lets those entries expire. The same goes
+    # for tokens whose decimals could not be resolved.
+    if (
+        ERROR not in token_prices
+        and MISSING not in token_prices
+        and tokens_confirmed(i[4] for i in incentives)
+    ):
+        builds.record("price", round, inputs)
 
     print(f"Round {round} - Total votes: {total_score}")
 
 
 def main():
-    # Check if there is a current round
-    current_round = get_current_round()
-    if current_round is not None:
-        round_file = f"{OUTPUT_DIR}/round_{current_round:03d}_price.csv"
-        print(f"Current round: {current_round}.")
-        try:
-            os.remove(round_file)
-            print(f"Deleted {round_file}.")
-        except OSError as e:
-            print(f"Error: {e}")
-
     # incentives_main()
 
-    for round in range(1, get_last_round() + 1):
+    def price(round):
         print(f"Pricing round {round}")
-        price_round(round)
+        return price_round(round)
+
+    prefetch_snapshots(range(1, get_last_round() + 1))
+    run_rounds(price, range(1, get_last_round() + 1))
+
+    metrics.write_report()
 
 
 if __name__ == "__main__":
@@ -1,126 +1,212 @@
-from votium import rounds
-import csv
+from votium import builds, metrics, rounds
+from votium.files import write_csv, write_json
 import datetime
 import json
 import os
-import requests
+import threading
 
 
 OUTPUT_DIR = "output/snapshot"
 CACHE_DIR = "cache/snapshot"
-for dir in [OUTPUT_DIR, CACHE_DIR]:
-    os.makedirs(dir, exist_ok=True)
+
+PROPOSALS_CACHE_FILE = f"{CACHE_DIR}/proposals.json"
+
+SNAPSHOT_URL = os.environ.get("SNAPSHOT_URL", "https://hub.snapshot.org/graphql")
+
+# Snapshot caps proposals per query at 1000
+PAGE_SIZE = 1000
+
+# Proposals per bulk detail query
+PROPOSAL_BATCH_SIZE = 50
+
+# Proposal list memoized for the run
+_proposal_list = None
+_proposal_lock = threading.Lock()
 
 
 def _snapshot_graphql(query):
     """Base function for querying Snapshot GraphQL"""
 
-    url = "https://hub.snapshot.org/graphql"
+    import requests
+
     headers = {"Content-Type": "application/json"}
     payload = json.dumps({"query": query})
-    response = requests.post(url, headers=headers, data=payload)
+    with metrics.timer("snapshot"):
+        response = requests.post(SNAPSHOT_URL, headers=headers, data=payload)
     return json.loads(response.text)
 
 
-def get_snapshot_list():
+def _fetch_proposals(created_gte):
+    """Page through all gauge weight proposals created at or after created_gte."""
+
+    proposals = []
+    seen = set()
+    skip = 0
+    while True:
+        response = _snapshot_graphql(f"""
+            query {{
+                proposals (
+                    first: {PAGE_SIZE},
+                    skip: {skip},
+                    where: {{
+                        space_in: ["cvx.eth"],
+                        title_contains: "Gauge Weight for",
+                        created_gte: {created_gte}
+                    }},
+                    orderBy: "created",
+                    orderDirection: asc
+                ) {{
+                    id
+                    title
+                    start
+                    end
+                    author
+                    created
+                }}
+            }}
+            """)
+        page = response["data"]["proposals"]
+        # Each page starts at the last timestamp of the previous one, so
+        # proposals created in that second come back again
+        for proposal in page:
+            if proposal["id"] not in seen:
+                seen.add(proposal["id"])
+                proposals.append(proposal)
+        if len(page) < PAGE_SIZE:
+            return proposals
+        if page[-1]["created"] == created_gte:
+            # A full page from a single second, so step past it
+            skip += len(page)
+        else:
+            created_gte = page[-1]["created"]
+            skip = 0
+
+
+def _update_proposals():
+    """Fetch proposals created since the last cached one and save the cache."""
+
+    proposals = []
+    if os.path.exists(PROPOSALS_CACHE_FILE):
+        with open(PROPOSALS_CACHE_FILE) as f:
+            proposals = json.load(f)
+
+    created_gte = proposals[-1]["created"] if proposals else 0
+    print(f"Fetching gauge weight proposals created since {created_gte}...")
+    known = {p["id"] for p in proposals}
+    new = [p for p in _fetch_proposals(created_gte) if p["id"] not in known]
+    if new:
+        proposals.extend(new)
+        write_json(PROPOSALS_CACHE_FILE, proposals, indent=4)
+    return proposals
+
+
+def get_snapshot_list(refresh=False):
     """
     Gets the list of the gauge weight proposals (incl. test proposals)
+
+    The list is fetched incrementally once per run and then memoized. Pass
+    refresh=True to check for new proposals again.
     """
 
-    # Fetch the gauge weight proposals
-    print("Fetching gauge weight proposals...")
-    response = _snapshot_graphql("""
-        query {
-            proposals (
-                first: 100,
-                skip: 0,
-                where: {
-                    space_in: ["cvx.eth"],
-                    title_contains: "Gauge Weight for"
-                },
-                orderBy: "created",
-                orderDirection: asc
-            ) {
-                id
-                title
-                start
-                end
-                author
-            }
-        }
-        """)
-
-    data = response["data"]["proposals"]
-
-    proposal_list = []
-    round = 0
-    for proposal in data:
-        test = False
-        title = proposal["title"]
-        if title.startswith("(TEST)") or title.startswith("FXN"):
-            test = True
-        else:
-            round += 1
-        id = proposal["id"]
-        start = datetime.datetime.fromtimestamp(proposal["start"])
-        end = datetime.datetime.fromtimestamp(proposal["end"])
-        proposal_list.append([round if not test else "0", start, end, id, title])
+    global _proposal_list
 
-    # Save to output
-    output_file = f"{OUTPUT_DIR}/snapshot_list.csv"
-    with open(output_file, "w") as f:
-        writer = csv.writer(f)
-        writer.writerow(["round", "start", "end", "id", "title"])
-        writer.writerows(proposal_list)
+    with _proposal_lock:
+        if _proposal_list is not None and not refresh:
+            return _proposal_list
 
-    return proposal_list
+        data = _update_proposals()
 
+        proposal_list = []
+        round = 0
+        for proposal in data:
+            test = False
+            title = proposal["title"]
+            if title.startswith("(TEST)") or title.startswith("FXN"):
+                test = True
+            else:
+                round += 1
+            id = proposal["id"]
+            start = datetime.datetime.fromtimestamp(proposal["start"])
+            end = datetime.datetime.fromtimestamp(proposal["end"])
+            proposal_list.append([round if not test else "0", start, end, id, title])
 
-def get_snapshot(round):
-    """Gets the details of a proposal"""
+        # Save to output
+        output_file = f"{OUTPUT_DIR}/snapshot_list.csv"
+        write_csv(output_file, ["round", "start", "end", "id", "title"], proposal_list)
 
-    # Check cache
-    cache_file = f"{CACHE_DIR}/round_{round:03d}_snapshot.json"
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            response = json.load(f)
-
-    else:
-        # Look up the proposal id
-        proposal_list = get_snapshot_list()
-        # Filter out any with round 0
-        proposal_list = [x for x in proposal_list if x[0] != "0"]
-        id = proposal_list[round - 1][3]
-
-        print(f"Fetching proposal {round} - {id}...")
+        _proposal_list = proposal_list
+        return proposal_list
+
+
+def _snapshot_cache_file(round):
+    return f"{CACHE_DIR}/round_{round:03d}_snapshot.json"
+
+
+def prefetch_snapshots(round_list):
+    """
+    Fill the per-round proposal cache for every round that is missing.
+
+    Proposals are requested in bulk with only the fields the pipeline uses.
+    """
+
+    round_list = list(round_list)
+    missing = [r for r in round_list if not os.path.exists(_snapshot_cache_file(r))]
+    metrics.cache("snapshot", hits=len(round_list) - len(missing), misses=len(missing))
+    if not missing:
+        return
+
+    # Look up the proposal ids, filtering out any with round 0
+    proposal_list = [x for x in get_snapshot_list() if x[0] != "0"]
+    ids = {proposal_list[r - 1][3]: r for r in missing if r <= len(proposal_list)}
+    ids_list = list(ids)
+
+    for i in range(0, len(ids_list), PROPOSAL_BATCH_SIZE):
+        batch = ids_list[i:i + PROPOSAL_BATCH_SIZE]
+        print(f"Fetching {len(batch)} proposals...")
         response = _snapshot_graphql(f"""
             query {{
-                proposal(id:"{id}") {{
-                    id
-                    title
-                    body
-                    start
-                    end
-                    snapshot
-                    state
-                    author
-                    created
-                    space {{
-                        id
-                        name
+                proposals (
+                    first: {len(batch)},
+                    where: {{
+                        id_in: {json.dumps(batch)}
                     }}
+                ) {{
+                    id
                     choices
                     scores
                     scores_state
                     scores_total
-                    scores_updated
                 }}
             }}
             """)
 
-        # Cache the proposal
-        with open(cache_file, "w") as f:
-            json.dump(response, f, indent=4)
+        # Cache each proposal in the same shape as a single proposal query
+        for proposal in response["data"]["proposals"]:
+            write_json(
+                _snapshot_cache_file(ids[proposal["id"]]),
+                {"data": {"proposal": proposal}},
+                indent=4,
+            )
+
+
+def has_snapshot(round) -> bool:
+    """Return whether a round's proposal is on Snapshot, fetching it if needed."""
+
+    if not os.path.exists(_snapshot_cache_file(round)):
+        prefetch_snapshots([round])
+    return os.path.exists(_snapshot_cache_file(round))
+
+
+@metrics.stage("snapshot")
+def get_snapshot(round):
+    """Gets the details of a proposal"""
+
+    # Check cache
+    cache_file = _snapshot_cache_file(round)
+    if not os.path.exists(cache_file):
+        prefetch_snapshots([round])
+    with open(cache_file, "r") as f:
+        response = json.load(f)
 
     choices = response["data"]["proposal"]["choices"]
     scores = response["data"]["proposal"]["scores"]
@@ -138,38 +224,56 @@ def get_snapshot(round):
 
     # Save to output
     output_file = f"{OUTPUT_DIR}/round_{round:03d}_snapshot.csv"
-    with open(output_file, "w") as f:
-        writer = csv.writer(f)
-        writer.writerow(["choice_name", "choice_index", "score", "pct_score"])
-        writer.writerows(proposal)
+    write_csv(
+        output_file, ["choice_name", "choice_index", "score", "pct_score"], proposal
+    )
+    metrics.rows("snapshot", len(proposal))
 
     return proposal
 
 
+def refresh_snapshots(round_list):
+    """
+    Refetch every cached proposal whose scores are not final yet.
+
+    Scores keep changing until a proposal closes, so cached proposals that
+    are still pending are dropped and fetched again.
+    """
+
+    stale = []
+    for round in round_list:
+        cache_file = _snapshot_cache_file(round)
+        if not os.path.exists(cache_file):
+            continue
+        with open(cache_file) as f:
+            proposal = json.load(f)["data"]["proposal"]
+        if proposal.get("scores_state") != "final":
+            os.remove(cache_file)
+            stale.append(round)
+    if stale:
+        print(f"Refreshing scores for rounds {stale}")
+    prefetch_snapshots(round_list)
+
+
+def snapshot_version(round):
+    """Fingerprint of the cached proposal for a round, or None if not cached."""
+
+    return builds.file_fingerprint(_snapshot_cache_file(round))
+
+
 def main():
     """Build all snapshots"""
 
-    # Check if there is a current round
-    current_round = rounds.get_current_round()
-    if current_round is not None:
-        round_file = f"{OUTPUT_DIR}/round_{current_round:03d}_snapshot.csv"
-        cache_file = f"{CACHE_DIR}/round_{current_round:03d}_snapshot.json"
-        print(f"Current round: {current_round}.")
-        try:
-            if os.path.exists(round_file):
-                os.remove(round_file)
-                print(f"Deleted {round_file}.")
-                os.remove(f"{cache_file}")
-        except OSError as e:
-            print(f"Error: {e}")
-
     print("Getting list from Snapshot")
     get_snapshot_list()
 
     print("Getting details from Snapshot")
+    refresh_snapshots(range(1, rounds.get_last_round() + 1))
     for round in range(1, rounds.get_last_round() + 1):
         snapshot = get_snapshot(round)
 
+    metrics.write_report()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,99 @@
+"""
+Block timestamp resolution.
+
+Exact timestamps are fetched in batched JSON-RPC requests and kept in the
+persistent chain cache. The fast mode estimates timestamps by interpolating
+between a sparse set of exact anchor blocks, and only fetches exact headers
+for blocks that land near a round boundary or are explicitly requested.
+"""
+
+import bisect
+
+from votium import metrics, rounds
+from votium.executor import ThreadPool
+from votium.kvstore import get_store
+
+# Headers per batched JSON-RPC request
+BATCH_SIZE = 100
+
+# Block spacing between anchors used for interpolation
+ANCHOR_SPACING = 10_000
+
+# Estimates this close to a round boundary (in seconds) are fetched exactly
+BOUNDARY_MARGIN = 3600
+
+
+def _fetch_block_times(pool, block_numbers):
+    """Fetch block timestamps with batched eth_getBlockByNumber calls."""
+
+    def fetch(batch):
+        headers = pool.batch([("eth_getBlockByNumber", [hex(n), False]) for n in batch])
+        return {n: int(header["timestamp"], 16) for n, header in zip(batch, headers)}
+
+    batches = [
+        block_numbers[i:i + BATCH_SIZE] for i in range(0, len(block_numbers), BATCH_SIZE)
+    ]
+    times = {}
+    with ThreadPool(max_workers=pool.workers) as executor:
+        for batch_times in executor.map(fetch, batches):
+            times.update(batch_times)
+    return times
+
+
+def get_block_times(w3, block_numbers) -> dict:
+    """Return {block_number: timestamp} for all block_numbers."""
+
+    block_numbers = sorted({int(n) for n in block_numbers})
+    store = get_store()
+    cached = store.get_many("block_time", [str(n) for n in block_numbers])
+    times = {int(n): t for n, t in cached.items()}
+
+    missing = [n for n in block_numbers if n not in times]
+    metrics.cache("block_time_store", hits=len(times), misses=len(missing))
+    if missing:
+        print(f"Fetching timestamps for {len(missing)} blocks")
+        fetched = _fetch_block_times(w3.provider.pool, missing)
+        store.put_many("block_time", {str(n): t for n, t in fetched.items()})
+        times.update(fetched)
+    return times
+
+
+def _near_round_boundary(timestamp):
+    round = rounds.get_round_for_timestamp(timestamp - BOUNDARY_MARGIN)
+    return round != rounds.get_round_for_timestamp(timestamp + BOUNDARY_MARGIN)
+
+
+def estimate_block_times(w3, block_numbers, exact=()) -> dict:
+    """
+    Return {block_number: timestamp} using interpolation between anchors.
+
+    Blocks in exact, and blocks whose estimate falls within BOUNDARY_MARGIN
+    of a round start or end, get their exact timestamp. The rest are
+    estimates and are never written to the persistent cache.
+    """
+
+    block_numbers = sorted({int(n) for n in block_numbers})
+    if not block_numbers:
+        return {}
+
+    first, last = block_numbers[0], block_numbers[-1]
+    anchor_blocks = list(range(first, last, ANCHOR_SPACING)) + [last]
+    anchors = get_block_times(w3, anchor_blocks)
+    anchor_blocks = sorted(anchors)
+
+    times = {}
+    for n in block_numbers:
+        if n in anchors:
+            times[n] = anchors[n]
+            continue
+        i = bisect.bisect_left(anchor_blocks, n)
+        lo, hi = anchor_blocks[i - 1], anchor_blocks[i]
+        times[n] = anchors[lo] + (anchors[hi] - anchors[lo]) * (n - lo) // (hi - lo)
+
+    verify = {int(n) for n in exact} & set(block_numbers)
+    verify.update(
+        n for n, t in times.items() if n not in anchors and _near_round_boundary(t)
+    )
+    if verify:
+        times.update(get_block_times(w3, verify))
+    return times
@@ -0,0 +1,72 @@
+"""
+Build records for the per-round outputs.
+
+Each time a round artifact (incentives, price) is written, the fingerprints
+of the inputs it was built from are recorded alongside it. A round only needs
+rebuilding when its output is missing or one of its inputs has changed, e.g. a
+late incentive, updated Snapshot scores, a new gauge map or new manual
+prices.
+"""
+
+from hashlib import sha256
+import json
+import os
+
+from votium.kvstore import get_store
+
+BUILDS_FILE = "cache/builds.sqlite"
+
+
+def fingerprint(value) -> str:
+    """Return a stable hash of a JSON-serializable value."""
+
+    data = json.dumps(value, sort_keys=True, default=str)
+    return sha256(data.encode()).hexdigest()
+
+
+def file_fingerprint(path: str):
+    """Return a hash of a file's contents, or None if it does not exist."""
+
+    if not os.path.exists(path):
+        return None
+    digest = sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _namespace(artifact):
+    return f"build:{artifact}"
+
+
+def changed_inputs(artifact: str, round: int, inputs: dict) -> list:
+    """
+    Return the names of the inputs that changed since the round was built.
+
+    A round without a build record reports every input.
+    """
+
+    built = get_store(BUILDS_FILE).get(_namespace(artifact), str(round))
+    if built is None:
+        return list(inputs)
+    return [name for name, value in inputs.items() if built.get(name) != value]
+
+
+def needs_build(artifact: str, round: int, inputs: dict, output_file: str) -> bool:
+    """Return True, with the reason printed, if the round must be rebuilt."""
+
+    if not os.path.exists(output_file):
+        return True
+    changed = changed_inputs(artifact, round, inputs)
+    if not changed:
+        print(f"Using cached {output_file}")
+        return False
+    print(f"Rebuilding round {round} {artifact}: {', '.join(changed)} changed")
+    return True
+
+
+def record(artifact: str, round: int, inputs: dict) -> None:
+    """Record the inputs a round artifact was just built from."""
+
+    get_store(BUILDS_FILE).put(_namespace(artifact), str(round), inputs)
@@ -0,0 +1,147 @@
+"""
+Optional Parquet copies of the event, incentive and price datasets.
+
+Set VOTIUM_COLUMNAR=1 to enable (requires pyarrow). Each dataset is written
+under COLUMNAR_DIR partitioned by round (round=N directories) with typed
+columns, so analysis can load one round or one gauge with predicate pushdown
+instead of parsing every CSV. 256-bit amounts are stored as 32-byte big-endian
+fixed-width binary, which keeps them exact and sortable. Decimal-adjusted
+amounts can need more digits than Arrow decimals hold, so they stay strings.
+"""
+
+import os
+
+ENABLED = os.environ.get("VOTIUM_COLUMNAR") == "1"
+COLUMNAR_DIR = "output/parquet"
+
+UINT256 = "uint256"
+INT64 = "int64"
+FLOAT64 = "float64"
+BOOL = "bool"
+
+# Column types per dataset. Columns not listed are stored as strings.
+TYPES = {
+    "incentives": {
+        "amount": UINT256,
+        "timestamp": INT64,
+        "block_number": INT64,
+        "unadj_score": FLOAT64,
+    },
+    "price": {
+        "token_price": FLOAT64,
+        "usd_value": FLOAT64,
+        "score": FLOAT64,
+        "per_vote": FLOAT64,
+        "block_number": INT64,
+    },
+    "events": {
+        "_amount": UINT256,
+        "_maxPerVote": UINT256,
+        "_round": INT64,
+        "_index": INT64,
+        "_choiceIndex": INT64,
+        "_recycled": BOOL,
+        "logIndex": INT64,
+        "transactionIndex": INT64,
+        "blockNumber": INT64,
+    },
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("VOTIUM_COLUMNAR=1 requires pyarrow") from e
+    return pyarrow
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # MISSING / ERROR markers become nulls
+        return None
+
+
+def _convert(kind, values):
+    if kind == UINT256:
+        return [int(v).to_bytes(32, "big") for v in values]
+    if kind == INT64:
+        return [int(v) for v in values]
+    if kind == FLOAT64:
+        return [_to_float(v) for v in values]
+    if kind == BOOL:
+        return [v in (True, "True", "true") for v in values]
+    return [str(v) for v in values]
+
+
+def _arrow_type(pa, kind):
+    return {
+        UINT256: pa.binary(32),
+        INT64: pa.int64(),
+        FLOAT64: pa.float64(),
+        BOOL: pa.bool_(),
+    }.get(kind, pa.string())
+
+
+def _types(dataset):
+    return TYPES[dataset.split("/")[0]]
+
+
+def write_round(dataset: str, round: int, headers: list, rows: list) -> None:
+    """Write one round of a dataset as a typed Parquet partition."""
+
+    if not ENABLED:
+        return
+    pa = _pyarrow()
+
+    types = _types(dataset)
+    columns = list(zip(*rows)) if rows else [[] for _ in headers]
+    table = pa.table(
+        {
+            name: pa.array(
+                _convert(types.get(name), values),
+                type=_arrow_type(pa, types.get(name)),
+            )
+            for name, values in zip(headers, columns)
+        }
+    )
+
+    directory = f"{COLUMNAR_DIR}/{dataset}/round={round}"
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{directory}/.part-0.parquet.tmp"
+    pa.parquet.write_table(table, tmp_path)
+    os.replace(tmp_path, f"{directory}/part-0.parquet")
+
+
+def read_dataset(dataset: str, filter=None, columns=None):
+    """
+    Load a dataset as an Arrow table.
+
+    filter is a pyarrow.dataset expression and is pushed down to skip
+    partitions and row groups, e.g. field("round") == 60.
+    """
+
+    pa = _pyarrow()
+    return pa.dataset.dataset(
+        f"{COLUMNAR_DIR}/{dataset}", format="parquet", partitioning="hive"
+    ).to_table(filter=filter, columns=columns)
+
+
+def read_round(dataset: str, round: int, gauge: str = None, columns=None):
+    """Load one round of a dataset, optionally for a single gauge."""
+
+    field = _pyarrow().dataset.field
+    filter = field("round") == round
+    if gauge is not None:
+        filter = filter & (field("gauge") == gauge)
+    return read_dataset(dataset, filter=filter, columns=columns)
+
+
+def amount_to_int(value: bytes) -> int:
+    """Convert a stored uint256 amount back to an int."""
+
+    return int.from_bytes(value, "big")
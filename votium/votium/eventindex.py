@@ -0,0 +1,291 @@
+"""
+Memory-mapped binary index over an event store.
+
+Each store directory gets an INDEX_FILE of fixed-width records, one per
+cached event in store order: block number, log index, round, token id, gauge
+id and the amount as a 32-byte big-endian uint256, plus where the event's row
+sits in its CSV segment. Tokens and gauges are kept once each in string
+tables in INDEX_META_FILE, and records refer to them by position.
+
+Opening the index maps the file with a NumPy structured dtype, so nothing is
+parsed or copied up front. On the first selection the records are ordered by
+round once, after which each round is a binary search away. Collecting the
+blocks and tokens of a round works on the mapped buffer, and full rows are
+decoded only for the records that were selected, straight from the mapped
+segment.
+
+The index follows the manifest. Segments are immutable once written, so when
+the manifest changes only the segments the index has not seen are parsed.
+"""
+
+from functools import lru_cache
+import csv
+import json
+import mmap
+import os
+import threading
+
+from votium.files import atomic_open, write_json
+
+INDEX_FILE = "index.bin"
+INDEX_META_FILE = "index.json"
+
+# Bump when the record layout changes so old indexes are rebuilt
+INDEX_VERSION = 1
+
+# String table id for events without a token or gauge column
+NONE = 0xFFFFFFFF
+
+# Columns read into the records, by header name
+FIELDS = {"round": "_round", "token": "_token", "gauge": "_gauge", "amount": "_amount"}
+
+_lock = threading.Lock()
+_open = {}
+
+
+@lru_cache(maxsize=None)
+def record_dtype():
+    """The NumPy dtype of one index record."""
+
+    import numpy as np
+
+    return np.dtype(
+        [
+            ("block", "<u8"),
+            ("log_index", "<u4"),
+            ("round", "<u4"),
+            ("token", "<u4"),
+            ("gauge", "<u4"),
+            ("amount", "u1", 32),
+            ("segment", "<u4"),
+            ("offset", "<u8"),
+            ("length", "<u4"),
+        ]
+    )
+
+
+def _segment_key(store_dir, segment):
+    # Segment names are never reused, so a known name means known contents.
+    # The size also catches a file changed behind the store's back.
+    size = os.path.getsize(f"{store_dir}/{segment['file']}")
+    return {"file": segment["file"], "count": segment["count"], "size": size}
+
+
+def _key_tuple(key):
+    return key["file"], key["count"], key["size"]
+
+
+class EventIndex:
+    """The mapped records of one store and their string tables."""
+
+    def __init__(self, store_dir: str, meta: dict, records):
+        self.store_dir = store_dir
+        self.meta = meta
+        self.records = records
+        self.tokens = meta["tokens"]
+        self.gauges = meta["gauges"]
+        self._segments = {}
+        self._by_round = None
+
+    def _round_order(self):
+        """Return (record positions sorted by round, their rounds)."""
+
+        import numpy as np
+
+        with _lock:
+            if self._by_round is None:
+                order = np.argsort(self.records["round"], kind="stable")
+                self._by_round = order, np.asarray(self.records["round"][order])
+            return self._by_round
+
+    def select(self, rounds):
+        """Return the records of the given rounds, in store order."""
+
+        import numpy as np
+
+        order, sorted_rounds = self._round_order()
+        rounds = np.asarray(sorted(set(rounds)), dtype=sorted_rounds.dtype)
+        starts = np.searchsorted(sorted_rounds, rounds, side="left")
+        ends = np.searchsorted(sorted_rounds, rounds, side="right")
+        positions = [order[start:end] for start, end in zip(starts, ends) if end > start]
+        if not positions:
+            return self.records[:0]
+        return self.records[np.sort(np.concatenate(positions))]
+
+    def token_addresses(self, records) -> set:
+        return {self.tokens[i] for i in set(records["token"].tolist()) if i != NONE}
+
+    def amounts(self, records) -> list:
+        return [int.from_bytes(bytes(amount), "big") for amount in records["amount"]]
+
+    def _segment(self, n):
+        buffer = self._segments.get(n)
+        if buffer is None:
+            path = f"{self.store_dir}/{self.meta['segments'][n]['file']}"
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._segments[n] = buffer
+        return buffer
+
+    def rows(self, records):
+        """Yield the CSV rows of records, decoding only those rows."""
+
+        for segment, offset, length in zip(
+            records["segment"].tolist(),
+            records["offset"].tolist(),
+            records["length"].tolist(),
+        ):
+            line = self._segment(segment)[offset:offset + length].decode()
+            yield next(csv.reader([line]))
+
+
+def _line_spans(data):
+    """Yield (offset, length) of each line after the header."""
+
+    # Event rows hold numbers, hex and address lists, never line breaks
+    start = data.find(b"\n") + 1
+    while start < len(data):
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data)
+        length = end - start
+        if length and data[end - 1:end] == b"\r":
+            length -= 1
+        if length:
+            yield start, length
+        start = end + 1
+
+
+def _index_segment(store_dir, n, file, headers, round_column, tables):
+    """Parse one CSV segment into index records."""
+
+    import numpy as np
+
+    columns = {name: headers.index(h) for name, h in FIELDS.items() if h in headers}
+    if round_column is not None:
+        columns["round"] = round_column
+    log_index = headers.index("logIndex")
+
+    def intern(name, value):
+        strings, ids = tables[name]
+        if value not in ids:
+            ids[value] = len(strings)
+            strings.append(value)
+        return ids[value]
+
+    with open(f"{store_dir}/{file}", "rb") as f:
+        data = f.read()
+    spans = list(_line_spans(data))
+    rows = list(csv.reader(data[offset:offset + length].decode() for offset, length in spans))
+
+    def column(name, convert, default):
+        if name not in columns:
+            return [default] * len(rows)
+        return [convert(row[columns[name]]) for row in rows]
+
+    records = np.zeros(len(rows), dtype=record_dtype())
+    records["block"] = [int(row[-1]) for row in rows]
+    records["log_index"] = [int(row[log_index]) for row in rows]
+    records["round"] = column("round", int, 0)
+    records["token"] = column("token", lambda value: intern("tokens", value), NONE)
+    records["gauge"] = column("gauge", lambda value: intern("gauges", value), NONE)
+    amounts = column("amount", lambda value: int(value).to_bytes(32, "big"), bytes(32))
+    records["amount"] = np.frombuffer(b"".join(amounts), dtype="u1").reshape(-1, 32)
+    records["segment"] = n
+    records["offset"] = [offset for offset, _ in spans]
+    records["length"] = [length for _, length in spans]
+    return records
+
+
+def _read_meta(store_dir, headers):
+    path = f"{store_dir}/{INDEX_META_FILE}"
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    if meta.get("version") != INDEX_VERSION or meta.get("headers") != headers:
+        return None
+    # The records are written before the metadata, so a crash in between
+    # leaves records that do not match
+    size = os.path.getsize(f"{store_dir}/{INDEX_FILE}") if meta["count"] else 0
+    if size != meta["count"] * record_dtype().itemsize:
+        return None
+    return meta
+
+
+def _map(store_dir, meta):
+    import numpy as np
+
+    if not meta["count"]:
+        return np.zeros(0, dtype=record_dtype())
+    return np.memmap(f"{store_dir}/{INDEX_FILE}", dtype=record_dtype(), mode="r")
+
+
+def _update(store_dir, manifest, keys, meta):
+    """Index the segments in keys, reusing the records of known segments."""
+
+    import numpy as np
+
+    if meta is None:
+        meta = {"segments": [], "tokens": [], "gauges": []}
+        old = np.zeros(0, dtype=record_dtype())
+    else:
+        old = _map(store_dir, meta)
+    tables = {
+        name: (list(meta[name]), {value: i for i, value in enumerate(meta[name])})
+        for name in ["tokens", "gauges"]
+    }
+    known = {_key_tuple(key): i for i, key in enumerate(meta["segments"])}
+    # Records are in segment order, so each segment's records are one slice
+    bounds = np.searchsorted(old["segment"], range(len(meta["segments"]) + 1))
+
+    parts = []
+    parsed = 0
+    for n, key in enumerate(keys):
+        j = known.get(_key_tuple(key))
+        if j is not None:
+            records = np.array(old[bounds[j]:bounds[j + 1]])
+            records["segment"] = n
+        else:
+            records = _index_segment(
+                store_dir, n, key["file"], manifest["headers"], manifest["round_column"], tables
+            )
+            parsed += 1
+        parts.append(records)
+    records = np.concatenate(parts) if parts else np.zeros(0, dtype=record_dtype())
+
+    meta = {
+        "version": INDEX_VERSION,
+        "headers": manifest["headers"],
+        "segments": keys,
+        "count": len(records),
+        "tokens": tables["tokens"][0],
+        "gauges": tables["gauges"][0],
+    }
+    with atomic_open(f"{store_dir}/{INDEX_FILE}", "wb") as f:
+        f.write(records.tobytes())
+    write_json(f"{store_dir}/{INDEX_META_FILE}", meta)
+    if parsed:
+        print(f"Indexed {parsed} segments in {store_dir}")
+    return meta
+
+
+def load(store_dir: str, manifest: dict) -> EventIndex:
+    """Open the index for a store, bringing it up to date with the manifest."""
+
+    with _lock:
+        keys = [_segment_key(store_dir, s) for s in manifest["segments"]]
+        index = _open.get(os.path.abspath(store_dir))
+        if index is not None and index.meta["segments"] == keys:
+            return index
+
+        if not keys:
+            # Nothing to index, and reads should not create the store
+            meta = {"segments": [], "count": 0, "tokens": [], "gauges": []}
+        else:
+            meta = _read_meta(store_dir, manifest["headers"])
+            if meta is None or meta["segments"] != keys:
+                meta = _update(store_dir, manifest, keys, meta)
+        index = EventIndex(store_dir, meta, _map(store_dir, meta))
+        _open[os.path.abspath(store_dir)] = index
+        return index
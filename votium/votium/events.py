@@ -1,95 +1,204 @@
-from web3 import Web3
-from dotenv import load_dotenv
-import csv
+from collections import defaultdict
+from functools import lru_cache
+from votium import eventstore, metrics
+from votium.logs import iter_logs
+import json
 import os
 
-load_dotenv()
-WEB3_HTTP_PROVIDER = os.environ.get("WEB3_HTTP_PROVIDER")
-w3 = Web3(Web3.HTTPProvider(WEB3_HTTP_PROVIDER))
-
 CACHE_DIR = "cache/events"
-os.makedirs(CACHE_DIR, exist_ok=True)
 
-def get_events(abi_file_path: str,
-               contract_address: str,
-               event_name: str,
-               start_block: int,
-               end_block: int) -> list:
-    """
-    Get and cache all specified events.
+# How far back to roll the cache when the checkpoint block was reorged out
+REORG_DEPTH = 64
+
+# Buffered rows that trigger writing a segment while scanning
+FLUSH_ROWS = 5_000
+
+
+def _store_dir(contract_address, event_name):
+    return f"{CACHE_DIR}/{contract_address}-{event_name}"
+
+
+def _w3():
+    # Imported on first use so that reading the cache never loads web3
+    from votium.provider import get_web3
+
+    return get_web3()
+
+
+@lru_cache(maxsize=None)
+def _decoder(abi_file_path, event_name):
+    from votium.decoder import EventDecoder
+
+    with open(abi_file_path) as f:
+        return EventDecoder(json.load(f), event_name)
+
+
+def _head():
+    return _w3().provider.pool.head()
+
+
+def _block_hash(block_number):
+    return _w3().eth.get_block(block_number)["hash"].hex()
+
+
+def _same_hash(a, b):
+    return a.lower().removeprefix("0x") == b.lower().removeprefix("0x")
+
+
+def _check_reorg(store_dir):
+    """Roll back the cached tail if the checkpoint block is no longer canonical."""
+
+    checkpoint = eventstore.load_manifest(store_dir)["checkpoint"]
+    if checkpoint is None:
+        return
+    if _same_hash(_block_hash(checkpoint["block"]), checkpoint["hash"]):
+        return
+
+    print(f"Reorg detected at checkpoint block {checkpoint['block']}")
+    depth = REORG_DEPTH
+    while True:
+        block = max(checkpoint["block"] - depth, 0)
+        eventstore.rollback(store_dir, block, {"block": block, "hash": _block_hash(block)})
+        last = eventstore.last_event(store_dir)
+        if last is None or _same_hash(_block_hash(int(last[-1])), last[-2]):
+            return
+        depth *= 2
+
 
-    WARNING: The cache only works if the end_block is increasing. If the start
-    block is changed, or if the end block is set to an earlier block, be sure
-    to manually delete the cache file.
+def read_events(contract_address: str, event_name: str) -> list:
+    """Return the cached events without touching the chain."""
+
+    return eventstore.read_events(_store_dir(contract_address, event_name))
+
+
+def iter_events(contract_address: str, event_name: str):
+    """Yield the cached events in block order without loading them all."""
+
+    return eventstore.iter_events(_store_dir(contract_address, event_name))
+
+
+def iter_round_events(contract_address: str, event_name: str, round: int):
+    """Yield the cached events for one round."""
+
+    return eventstore.iter_round(_store_dir(contract_address, event_name), round)
+
+
+def load_event_index(contract_address: str, event_name: str):
+    """Open the memory-mapped index of the cached events."""
+
+    return eventstore.load_index(_store_dir(contract_address, event_name))
+
+
+def get_max_round(contract_address: str, event_name: str):
+    """Return the highest round among the cached events."""
+
+    return eventstore.get_max_round(_store_dir(contract_address, event_name))
+
+
+def read_event_headers(contract_address: str, event_name: str) -> list:
+    """Return the column names of the cached events."""
+
+    return eventstore.load_manifest(_store_dir(contract_address, event_name))["headers"]
+
+
+def index_events(events, column: int) -> dict:
+    """Group event rows by the value in column in a single pass."""
+
+    index = defaultdict(list)
+    for event in events:
+        index[event[column]].append(event)
+    return index
+
+
+@metrics.stage("events")
+def sync_events(abi_file_path: str,
+                contract_address: str,
+                event_name: str,
+                start_block: int,
+                end_block: int,
+                round_column: int = None) -> int:
+    """
+    Bring the event cache up to end_block and return the number of new events.
+
+    The cache records the last scanned block as a checkpoint, so only blocks
+    after it are fetched. Logs are converted as each block window arrives and
+    written out every FLUSH_ROWS rows, which keeps memory bounded and lets an
+    interrupted scan resume from the last flushed window. If the start block
+    is changed to an earlier block, be sure to manually delete the cache
+    directory.
     """
 
     print(f"Getting events for {event_name} from {start_block} to {end_block}")
 
-    CACHE_FILE = f"{CACHE_DIR}/{contract_address}-{event_name}.csv"
+    store_dir = _store_dir(contract_address, event_name)
+    legacy_file = f"{store_dir}.csv"
+    if not os.path.exists(store_dir) and os.path.exists(legacy_file):
+        eventstore.import_legacy_csv(store_dir, legacy_file, round_column)
+
+    _check_reorg(store_dir)
+
+    checkpoint = eventstore.load_manifest(store_dir)["checkpoint"]
+    if checkpoint is not None:
+        start_block = max(start_block, checkpoint["block"] + 1)
+        print(f"Cache checkpoint at block {checkpoint['block']}. Starting from block {start_block}")
+
+    if start_block > end_block:
+        print(f"No new blocks to scan for {event_name}")
+        return 0
+
+    # Past the lowest endpoint head, a lagging endpoint would answer with no
+    # logs and the checkpoint would skip blocks it never saw
+    head = _head()
+    if head < end_block:
+        print(f"Endpoints are synced to block {head}, scanning up to it")
+        end_block = head
+        if start_block > end_block:
+            return 0
+
+    from votium.decoder import get_logs_raw, sort_key
+
+    decoder = _decoder(abi_file_path, event_name)
+
+    print(f"Fetching {event_name} events from {start_block} to {end_block}")
+    windows = iter_logs(
+        lambda from_block, to_block: get_logs_raw(
+            _w3(), contract_address, decoder.topic, from_block, to_block
+        ),
+        start_block,
+        end_block,
+        key=sort_key,
+    )
+
+    count = 0
+    rows = []
+    scanned_from = start_block
+    for _, to_block, logs in windows:
+        rows.extend(decoder.rows(logs))
+        if len(rows) < FLUSH_ROWS and to_block < end_block:
+            continue
+        eventstore.append(
+            store_dir,
+            decoder.headers,
+            rows,
+            scanned_from,
+            {"block": to_block, "hash": _block_hash(to_block)},
+            round_column,
+        )
+        count += len(rows)
+        rows = []
+        scanned_from = to_block + 1
+
+    print(f"Found {count} {event_name} events")
+    metrics.rows("events", count)
+    return count
 
-    events = []
 
-    # Check if file exists and if so get the highest number block
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, "r") as f:
-            reader = csv.reader(f)
-            next(reader)
-            events = list(reader)
-            highest_block = max(int(row[-1]) for row in events) + 1
-            start_block = highest_block
-            print(f"Found {len(events)} events in cache. Starting from block {start_block}")
+def get_events(abi_file_path: str,
+               contract_address: str,
+               event_name: str,
+               start_block: int,
+               end_block: int) -> list:
+    """Get and cache all specified events."""
 
-    with open(abi_file_path) as f:
-        abi = f.read()
-    contract = w3.eth.contract(address=contract_address, abi=abi)
-
-    fx = getattr(contract.events, event_name)
-    event_filter = fx.create_filter(fromBlock=start_block, toBlock=end_block)
-
-    print(f"Filtering {event_name} events from {start_block} to {end_block}")
-    event_log = event_filter.get_all_entries()
-
-    print(f"Found {len(event_log)} {event_name} events{CACHE_FILE}")
-    for event in event_log:
-
-        values = []
-        for key, value in event["args"].items():
-            if isinstance(value, bytes):
-                values.append(value.hex())
-            else:
-                values.append(value)
-
-        values.extend([
-            event["event"],
-            event["logIndex"],
-            event["transactionIndex"],
-            event["transactionHash"].hex(),
-            event["address"],
-            event["blockHash"].hex(),
-            event["blockNumber"],
-        ])
-
-        events.append(values)
-
-    if len(event_log) > 0:
-        print(f"Found {len(event_log)} {event_name} events{CACHE_FILE}")
-        with open(CACHE_FILE, "w") as f:
-            writer = csv.writer(f)
-            headers = []
-            for key, value in event["args"].items():
-                headers.append(key)
-            headers.extend([
-                'event',
-                'logIndex',
-                'transactionIndex',
-                'transactionHash',
-                'address',
-                'blockHash',
-                'blockNumber',
-            ])
-            writer.writerow(headers)
-            writer.writerows(events)
-    else:
-        print(f"No {event_name} events found.")
-
-    return events
+    sync_events(abi_file_path, contract_address, event_name, start_block, end_block)
+    return read_events(contract_address, event_name)
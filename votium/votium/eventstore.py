@@ -0,0 +1,283 @@
+"""
+Append-only, segmented event cache.
+
+Each contract event gets a directory holding numbered CSV segments and a
+manifest. The manifest lists the segments in block order and records the
+checkpoint, the last block that was scanned along with its hash. Segments and
+the manifest are written atomically and the manifest is written last, so a
+crash leaves the previous state intact.
+
+When the events carry a round column, each segment also records the range of
+rounds it holds. Reads of the whole store stream one segment at a time, while
+reads of a round, and of the last event, go through the memory-mapped index
+in eventindex and decode only the rows they return.
+"""
+
+import csv
+import json
+import os
+
+from votium import eventindex
+from votium.files import write_csv, write_json
+
+MANIFEST_FILE = "manifest.json"
+
+# Merge small neighbouring segments once there are more than this many
+MAX_SEGMENTS = 64
+
+# Rows per segment when writing imports and merging segments
+SEGMENT_ROWS = 10_000
+
+
+def _manifest_path(store_dir):
+    return f"{store_dir}/{MANIFEST_FILE}"
+
+
+def _empty_manifest():
+    return {
+        "headers": [],
+        "round_column": None,
+        "segments": [],
+        "checkpoint": None,
+        "next_segment": 0,
+    }
+
+
+def load_manifest(store_dir: str) -> dict:
+    """Load the store manifest, or an empty one if the store is new."""
+
+    path = _manifest_path(store_dir)
+    if not os.path.exists(path):
+        return _empty_manifest()
+    with open(path) as f:
+        return {**_empty_manifest(), **json.load(f)}
+
+
+def save_manifest(store_dir: str, manifest: dict) -> None:
+    write_json(_manifest_path(store_dir), manifest, indent=2)
+
+
+def _iter_segment(store_dir, segment):
+    with open(f"{store_dir}/{segment['file']}", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        yield from reader
+
+
+def _read_segment(store_dir, segment):
+    return list(_iter_segment(store_dir, segment))
+
+
+def _write_segment(store_dir, manifest, rows, start_block, end_block):
+    # Numbered so a block range rewritten after a rollback never reuses the
+    # name of a file it replaced, which the index relies on
+    number = manifest["next_segment"]
+    manifest["next_segment"] = number + 1
+    name = f"segment_{number:06d}_{start_block:010d}_{end_block:010d}.csv"
+    write_csv(f"{store_dir}/{name}", manifest["headers"], rows)
+    segment = {
+        "file": name,
+        "start_block": start_block,
+        "end_block": end_block,
+        "count": len(rows),
+    }
+    round_column = manifest["round_column"]
+    if round_column is not None and rows:
+        rounds = [int(row[round_column]) for row in rows]
+        segment["rounds"] = [min(rounds), max(rounds)]
+    return segment
+
+
+def _remove_unreferenced(store_dir, manifest):
+    referenced = {s["file"] for s in manifest["segments"]}
+    for name in os.listdir(store_dir):
+        if name.startswith("segment_") and name not in referenced:
+            os.remove(f"{store_dir}/{name}")
+
+
+def iter_events(store_dir: str):
+    """Yield every cached event in block order, one segment at a time."""
+
+    for segment in load_manifest(store_dir)["segments"]:
+        yield from _iter_segment(store_dir, segment)
+
+
+def read_events(store_dir: str) -> list:
+    """Return all cached events in block order."""
+
+    return list(iter_events(store_dir))
+
+
+def load_index(store_dir: str) -> eventindex.EventIndex:
+    """Open the memory-mapped index of the store."""
+
+    return eventindex.load(store_dir, load_manifest(store_dir))
+
+
+def iter_round(store_dir: str, round: int):
+    """Yield the cached events for one round."""
+
+    manifest = load_manifest(store_dir)
+    if manifest["round_column"] is None:
+        raise ValueError(f"{store_dir} has no round column")
+
+    index = eventindex.load(store_dir, manifest)
+    yield from index.rows(index.select([round]))
+
+
+def get_max_round(store_dir: str):
+    """Return the highest round in the store, or None if it is empty."""
+
+    segments = load_manifest(store_dir)["segments"]
+    if not segments:
+        return None
+    if all("rounds" in segment for segment in segments):
+        return max(segment["rounds"][1] for segment in segments)
+
+    # Segments written before the round range was recorded
+    return int(load_index(store_dir).records["round"].max())
+
+
+def import_legacy_csv(store_dir: str, csv_file: str, round_column: int = None) -> None:
+    """Convert a single-file CSV cache into the first segments of a store."""
+
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = _empty_manifest()
+    manifest["round_column"] = round_column
+
+    count = 0
+    with open(csv_file, newline="") as f:
+        reader = csv.reader(f)
+        manifest["headers"] = next(reader)
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) == SEGMENT_ROWS:
+                _import_rows(store_dir, manifest, rows)
+                count += len(rows)
+                rows = []
+        if rows:
+            _import_rows(store_dir, manifest, rows)
+            count += len(rows)
+
+    save_manifest(store_dir, manifest)
+    print(f"Imported {count} events from {csv_file}")
+
+
+def _import_rows(store_dir, manifest, rows):
+    start_block = int(rows[0][-1])
+    end_block = int(rows[-1][-1])
+    if manifest["segments"]:
+        start_block = manifest["segments"][-1]["end_block"] + 1
+    manifest["segments"].append(
+        _write_segment(store_dir, manifest, rows, start_block, end_block)
+    )
+    # The last row holds the highest block, and its hash is a valid
+    # checkpoint for everything up to it.
+    manifest["checkpoint"] = {"block": end_block, "hash": rows[-1][-2]}
+
+
+def append(store_dir: str,
+           headers: list,
+           rows: list,
+           scanned_from: int,
+           checkpoint: dict,
+           round_column: int = None) -> None:
+    """
+    Append rows scanned from scanned_from up to the checkpoint block.
+
+    The checkpoint is advanced even when rows is empty so the range is never
+    scanned again.
+    """
+
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = load_manifest(store_dir)
+    if not manifest["headers"]:
+        manifest["headers"] = headers
+    if round_column is not None:
+        manifest["round_column"] = round_column
+    if rows:
+        manifest["segments"].append(
+            _write_segment(store_dir, manifest, rows, scanned_from, checkpoint["block"])
+        )
+    manifest["checkpoint"] = checkpoint
+
+    if len(manifest["segments"]) > MAX_SEGMENTS:
+        _compact(store_dir, manifest)
+
+    save_manifest(store_dir, manifest)
+    _remove_unreferenced(store_dir, manifest)
+
+
+def _compact(store_dir, manifest):
+    """Merge runs of neighbouring segments into segments of up to SEGMENT_ROWS."""
+
+    segments = []
+    run = []
+
+    def flush():
+        if len(run) == 1:
+            segments.append(run[0])
+        elif run:
+            rows = []
+            for segment in run:
+                rows.extend(_iter_segment(store_dir, segment))
+            segments.append(
+                _write_segment(
+                    store_dir,
+                    manifest,
+                    rows,
+                    run[0]["start_block"],
+                    run[-1]["end_block"],
+                )
+            )
+        run.clear()
+
+    for segment in manifest["segments"]:
+        if run and sum(s["count"] for s in run) + segment["count"] > SEGMENT_ROWS:
+            flush()
+        run.append(segment)
+    flush()
+
+    if len(segments) < len(manifest["segments"]):
+        print(f"Compacted {len(manifest['segments'])} segments into {len(segments)} in {store_dir}")
+    manifest["segments"] = segments
+
+
+def rollback(store_dir: str, block: int, checkpoint: dict) -> None:
+    """
+    Drop every cached event above block and reset the checkpoint.
+
+    Only segments that reach past block are touched. A segment straddling
+    block is rewritten with the rows at or below it.
+    """
+
+    manifest = load_manifest(store_dir)
+    segments = []
+    dropped = 0
+    for segment in manifest["segments"]:
+        if segment["end_block"] <= block:
+            segments.append(segment)
+            continue
+        rows = _read_segment(store_dir, segment)
+        kept = [row for row in rows if int(row[-1]) <= block]
+        dropped += len(rows) - len(kept)
+        if kept and segment["start_block"] <= block:
+            segments.append(
+                _write_segment(store_dir, manifest, kept, segment["start_block"], block)
+            )
+
+    manifest["segments"] = segments
+    manifest["checkpoint"] = checkpoint
+    save_manifest(store_dir, manifest)
+    _remove_unreferenced(store_dir, manifest)
+    print(f"Rolled back {dropped} events above block {block}")
+
+
+def last_event(store_dir: str):
+    """Return the last cached event row, or None if the store is empty."""
+
+    index = load_index(store_dir)
+    for row in index.rows(index.records[-1:]):
+        return row
+    return None
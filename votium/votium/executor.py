@@ -0,0 +1,127 @@
+"""
+Run independent per-round work in parallel.
+
+Rounds run in threads, as the stages spend their time waiting on RPC,
+Snapshot and DefiLlama. Whatever a round prints is captured and replayed in
+round order once the earlier rounds are done, so the combined log reads the
+same as a serial run. Pools started inside a round should be a ThreadPool,
+so what their tasks print lands in the round's log too.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import io
+import os
+import sys
+import threading
+
+WORKERS = int(os.environ.get("VOTIUM_WORKERS", "4"))
+
+
+class _ThreadStdout:
+    """Stand-in for sys.stdout that sends each worker thread's writes to its buffer."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, s):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer or self.stream).write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _run_in_thread(stdout, fn, round):
+    stdout.local.buffer = io.StringIO()
+    try:
+        return fn(round), stdout.local.buffer.getvalue(), None
+    except Exception as e:
+        return None, stdout.local.buffer.getvalue(), e
+    finally:
+        stdout.local.buffer = None
+
+
+def _run_with_buffer(stdout, buffer, fn, *args, **kwargs):
+    stdout.local.buffer = buffer
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        stdout.local.buffer = None
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor whose tasks print to the log of the round using it.
+
+    Each task's output is kept apart and written out in the order the tasks
+    were submitted when the pool shuts down, so it does not depend on which
+    task finished first. Outside of run_rounds it is a plain pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stdout = sys.stdout if isinstance(sys.stdout, _ThreadStdout) else None
+        self._outputs = []
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self._stdout is None:
+            return super().submit(fn, *args, **kwargs)
+        buffer = io.StringIO()
+        self._outputs.append(buffer)
+        return super().submit(_run_with_buffer, self._stdout, buffer, fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, **kwargs):
+        super().shutdown(wait=wait, **kwargs)
+        if wait:
+            outputs, self._outputs = self._outputs, []
+            for buffer in outputs:
+                sys.stdout.write(buffer.getvalue())
+
+
+def run_rounds(fn, rounds, workers: int = WORKERS) -> dict:
+    """
+    Call fn(round) for every round with a pool of worker threads.
+
+    Returns {round: result}. If any round fails, the first failure in round
+    order is raised after all logs have been written.
+    """
+
+    rounds = list(rounds)
+    if workers <= 1 or len(rounds) <= 1:
+        return {round: fn(round) for round in rounds}
+
+    stdout = sys.stdout
+    sys.stdout = _ThreadStdout(stdout)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    submit = lambda round: pool.submit(_run_in_thread, sys.stdout, fn, round)
+
+    results = {}
+    errors = {}
+    finished = {}
+    next_log = 0
+    try:
+        with pool:
+            futures = {submit(round): round for round in rounds}
+            for future in as_completed(futures):
+                round = futures[future]
+                result, output, error = future.result()
+                results[round] = result
+                finished[round] = output
+                if error is not None:
+                    errors[round] = error
+
+                # Replay logs for every round that is next in order
+                while next_log < len(rounds) and rounds[next_log] in finished:
+                    stdout.write(finished.pop(rounds[next_log]))
+                    next_log += 1
+    finally:
+        sys.stdout = stdout
+
+    for round in rounds:
+        if round in errors:
+            raise errors[round]
+    return {round: results[round] for round in rounds}
@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+import csv
+import json
+import os
+import stat
+import tempfile
+
+from votium import metrics
+
+# Read once, as setting the umask to read it is not thread-safe
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def _file_mode(path):
+    """The mode path has, or the mode a plain open() would give a new file."""
+
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_umask
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w"):
+    """
+    Open a temporary file next to path and move it over path on success.
+
+    Readers only ever see the old file or the complete new one, never a
+    partially written file.
+    """
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, mode, newline="" if "b" not in mode else None) as f:
+            # mkstemp creates the file owner-only and os.replace keeps that
+            os.chmod(f.fileno(), _file_mode(path))
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_csv(path: str, headers: list, rows) -> None:
+    """Atomically write headers and rows to a CSV file."""
+
+    with metrics.timer("file:csv"), atomic_open(path) as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def write_json(path: str, data, **kwargs) -> None:
+    """Atomically write data to a JSON file."""
+
+    with metrics.timer("file:json"), atomic_open(path) as f:
+        json.dump(data, f, **kwargs)
@@ -0,0 +1,188 @@
+"""
+Gauge registry.
+
+Maps gauge addresses to the short names used as Snapshot choices. Gauges are
+indexed by their 20-byte address, so lookups do not depend on how the
+address was cased. Each round builds a table from choice name to choice index
+once, after which resolving an incentive's gauge and score is two dict
+lookups.
+
+The gauge list lives in data/gauges.json and is refreshed from the Curve API
+on demand: when asked to, or the first time a run meets a gauge it does not
+know. A refresh only adds gauges, so names already in the file stay as they
+are. The incentive build records compare the names of the gauges in each
+round, so adding a gauge only rebuilds the rounds that use it. Gauges that are
+still unknown resolve to their address with a score of 0 instead of failing
+the round.
+"""
+
+from functools import lru_cache
+import json
+import os
+import threading
+import time
+
+from votium import builds, metrics
+from votium.files import write_json
+
+GAUGES_FILE = "data/gauges.json"
+CURVE_GAUGES_URL = os.environ.get(
+    "CURVE_GAUGES_URL", "https://api.curve.fi/api/getAllGauges"
+)
+
+
+def normalize(address):
+    """Return an address as 20 bytes, or None if it is not an address."""
+
+    if isinstance(address, bytes):
+        return address if len(address) == 20 else None
+    try:
+        raw = bytes.fromhex(address[2:] if address[:2] in ("0x", "0X") else address)
+    except (TypeError, ValueError):
+        return None
+    return raw if len(raw) == 20 else None
+
+
+class GaugeRegistry:
+    """Gauge short names indexed by normalized address."""
+
+    def __init__(self, path: str = GAUGES_FILE):
+        self.path = path
+        self.names = {}
+        self._lock = threading.Lock()
+        self._refreshed = False
+
+    def load(self):
+        """Load the gauge list from path."""
+
+        with open(self.path) as f:
+            data = json.load(f)
+        names = {}
+        for address, gauge in data["gauges"].items():
+            key = normalize(address)
+            if key is not None:
+                names[key] = gauge["shortName"]
+        self.names = names
+        return self
+
+    def name(self, address):
+        """Return the short name of a gauge, or None if it is unknown."""
+
+        key = normalize(address)
+        name = self.names.get(key)
+        if name is None and key is not None and self.refresh(once=True):
+            name = self.names.get(key)
+        return name
+
+    def version(self, addresses) -> str:
+        """Fingerprint the names of the given gauges, for the build records."""
+
+        # No refresh here, so checking which rounds to build stays offline
+        names = {}
+        for address in addresses:
+            key = normalize(address)
+            names[key.hex() if key is not None else address] = self.names.get(key)
+        return builds.fingerprint(names)
+
+    def refresh(self, once: bool = False) -> bool:
+        """
+        Add the new gauges from the Curve API and save the list.
+
+        Gauges already in the list keep their entry, and gauges the API no
+        longer lists are kept, as old rounds still refer to them. With
+        once=True only the first call of a run goes to the network. Returns
+        True if the list was refreshed.
+        """
+
+        with self._lock:
+            if once and self._refreshed:
+                return False
+            self._refreshed = True
+
+            print("Refreshing gauges from the Curve API")
+            try:
+                gauges = _fetch_curve_gauges()
+            except Exception as e:
+                print(f"Could not refresh gauges: {e}")
+                return False
+
+            with open(self.path) as f:
+                data = json.load(f)
+            known = {normalize(address) for address in data["gauges"]}
+            added = 0
+            for address, gauge in gauges.items():
+                key = normalize(address)
+                if key is None or key in known:
+                    continue
+                known.add(key)
+                data["gauges"][address] = gauge
+                self.names[key] = gauge["shortName"]
+                added += 1
+
+            data["lastUpdated"] = int(time.time())
+            write_json(self.path, data, indent=2, ensure_ascii=False)
+            print(f"Found {len(gauges)} gauges, {added} new")
+            return True
+
+    def for_round(self, snapshot):
+        """Return the gauge lookup table for a round's Snapshot choices."""
+
+        return RoundGauges(self, snapshot)
+
+
+class RoundGauges:
+    """Gauge name and score lookups for one round's Snapshot proposal."""
+
+    def __init__(self, registry: GaugeRegistry, snapshot):
+        self.registry = registry
+        self.snapshot = snapshot or []
+        # Where a name appears twice the first choice wins, as Snapshot shows
+        self.choices = {}
+        for index, choice in enumerate(self.snapshot):
+            self.choices.setdefault(choice[0], index)
+
+    def score(self, gauge_address) -> tuple:
+        """Return (gauge name, Snapshot score) for a gauge address."""
+
+        name = self.registry.name(gauge_address)
+        if name is None:
+            return gauge_address, 0
+        index = self.choices.get(name)
+        if index is None:
+            return name, 0
+        return name, self.snapshot[index][2]
+
+
+def _fetch_curve_gauges() -> dict:
+    """Return {mainnet gauge address: {shortName, active}} from the Curve API."""
+
+    import requests
+
+    with metrics.timer("curve"):
+        response = requests.get(CURVE_GAUGES_URL, timeout=30)
+    response.raise_for_status()
+
+    gauges = {}
+    for entry in response.json()["data"].values():
+        # Sidechain gauges are voted on through their mainnet root gauge
+        address = entry.get("rootGauge") or entry.get("gauge")
+        if not address or not entry.get("shortName"):
+            continue
+        gauges[address] = {
+            "shortName": entry["shortName"],
+            "active": not entry.get("is_killed", False),
+        }
+    return gauges
+
+
+@lru_cache(maxsize=None)
+def get_registry() -> GaugeRegistry:
+    """Return the shared gauge registry, loaded on first use."""
+
+    return GaugeRegistry().load()
+
+
+def refresh_gauges() -> None:
+    """Refresh the gauge list from the Curve API."""
+
+    get_registry().refresh()
@@ -0,0 +1,100 @@
+from functools import lru_cache
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_FILE = "cache/chain.sqlite"
+
+# SQLite limits the number of bound parameters per statement
+CHUNK_SIZE = 500
+
+
+class KVStore:
+    """
+    Namespaced key-value store backed by SQLite.
+
+    The database runs in WAL mode so parallel runs can read while another
+    writes, and each thread gets its own connection. Values are stored as
+    JSON. Entries are permanent unless written with a ttl in seconds.
+    """
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS kv (
+                    ns TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires REAL,
+                    PRIMARY KEY (ns, key)
+                ) WITHOUT ROWID
+                """
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(kv)")]
+            if "expires" not in columns:
+                conn.execute("ALTER TABLE kv ADD COLUMN expires REAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns: str, key: str, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ?"
+            " AND (expires IS NULL OR expires > ?)",
+            (ns, key, time.time()),
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def get_many(self, ns: str, keys) -> dict:
+        """Return {key: value} for the keys that are present."""
+
+        keys = list(keys)
+        now = time.time()
+        found = {}
+        for i in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[i:i + CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn().execute(
+                f"SELECT key, value FROM kv WHERE ns = ? AND key IN ({placeholders})"
+                " AND (expires IS NULL OR expires > ?)",
+                (ns, *chunk, now),
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    def put(self, ns: str, key: str, value, ttl: float = None) -> None:
+        self.put_many(ns, {key: value}, ttl=ttl)
+
+    def put_many(self, ns: str, items: dict, ttl: float = None) -> None:
+        if not items:
+            return
+        expires = None if ttl is None else time.time() + ttl
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (ns, key, value, expires)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (ns, key, json.dumps(value), expires)
+                    for key, value in items.items()
+                ],
+            )
+
+
+@lru_cache(maxsize=None)
+def get_store(path: str = CACHE_FILE) -> KVStore:
+    """Return the shared store for path."""
+
+    return KVStore(path)
@@ -0,0 +1,202 @@
+"""
+Batched historical prices from the DefiLlama coins API.
+
+Lookups are grouped by timestamp and each group is priced with one
+multi-coin request. Requests go through a pooled keep-alive session from a
+small worker pool, under a shared rate limit, and are retried with backoff on
+429 and 5xx responses.
+
+Results are kept in a persistent price store keyed by (chain, token,
+timestamp). Historical prices never change so they are kept forever, while
+MISSING and ERROR results expire so they are retried later.
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+import json
+import os
+import random
+import threading
+import time
+
+from votium import metrics
+from votium.executor import ThreadPool
+from votium.kvstore import get_store
+
+LLAMA_URL = os.environ.get("LLAMA_URL", "https://coins.llama.fi")
+MAX_WORKERS = int(os.environ.get("LLAMA_WORKERS", "4"))
+RATE_LIMIT = float(os.environ.get("LLAMA_RATE_LIMIT", "5"))  # requests/sec
+MAX_RETRIES = 5
+
+# Keep URLs well under common length limits
+COINS_PER_REQUEST = 50
+
+MISSING = "MISSING"
+ERROR = "ERROR"
+
+PRICE_CACHE_FILE = "cache/prices.sqlite"
+
+# Prices for tokens that are missing from DefiLlama / need to use coingecko,
+# keyed by "symbol:timestamp"
+MANUAL_PRICES_FILE = "data/manual_prices.json"
+
+# How long (in seconds) to remember lookups that found no price
+MISSING_TTL = 24 * 60 * 60
+ERROR_TTL = 60 * 60
+
+_rate_lock = threading.Lock()
+_next_request = 0.0
+
+
+def _wait_for_rate_limit():
+    global _next_request
+    with _rate_lock:
+        now = time.monotonic()
+        wait = _next_request - now
+        _next_request = max(now, _next_request) + 1 / RATE_LIMIT
+    if wait > 0:
+        time.sleep(wait)
+
+
+@lru_cache(maxsize=None)
+def get_manual_prices() -> dict:
+    with open(MANUAL_PRICES_FILE) as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def _session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+    return session
+
+
+def _get(url):
+    """GET url, retrying 429 and 5xx responses. Returns the last response."""
+
+    import requests
+
+    for attempt in range(MAX_RETRIES + 1):
+        _wait_for_rate_limit()
+        try:
+            with metrics.timer("llama"):
+                response = _session().get(url, timeout=30)
+        except requests.exceptions.RequestException as e:
+            if attempt == MAX_RETRIES:
+                raise
+            print(f"DefiLlama request failed ({e}), retrying")
+        else:
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            if attempt == MAX_RETRIES:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                time.sleep(int(retry_after))
+                continue
+        time.sleep(2 ** attempt + random.random())
+
+
+def _price_batch(chain, timestamp, tokens):
+    import requests
+
+    coins = ",".join(f"{chain}:{token}" for token in tokens)
+    try:
+        response = _get(f"{LLAMA_URL}/prices/historical/{timestamp}/{coins}")
+    except requests.exceptions.RequestException as e:
+        print(f"DefiLlama error at {timestamp}: {e}")
+        return {(token, timestamp): ERROR for token in tokens}
+
+    if response.status_code != 200:
+        print(f"DefiLlama error at {timestamp}: {response.status_code}")
+        return {(token, timestamp): ERROR for token in tokens}
+
+    found = {
+        key.lower(): value["price"]
+        for key, value in response.json().get("coins", {}).items()
+    }
+    return {
+        (token, timestamp): found.get(f"{chain}:{token}".lower(), MISSING)
+        for token in tokens
+    }
+
+
+def _cache_key(chain, token, timestamp):
+    return f"{chain}:{token.lower()}:{timestamp}"
+
+
+def seed_prices(prices: dict, chain: str = "ethereum") -> None:
+    """Store known {(token_address, timestamp): price} entries permanently."""
+
+    get_store(PRICE_CACHE_FILE).put_many(
+        "price",
+        {_cache_key(chain, token, ts): price for (token, ts), price in prices.items()},
+    )
+
+
+def get_prices(lookups, chain: str = "ethereum") -> dict:
+    """
+    Price many (token_address, timestamp) lookups.
+
+    Returns {(token_address, timestamp): price}, where price is the USD price
+    or MISSING if DefiLlama has none, or ERROR if the request failed. Only
+    lookups missing from the price store go to the network.
+    """
+
+    lookups = set(lookups)
+    store = get_store(PRICE_CACHE_FILE)
+    cached = store.get_many(
+        "price", [_cache_key(chain, token, ts) for token, ts in lookups]
+    )
+
+    prices = {}
+    by_timestamp = defaultdict(set)
+    for token, timestamp in lookups:
+        key = _cache_key(chain, token, timestamp)
+        if key in cached:
+            prices[(token, timestamp)] = cached[key]
+        else:
+            by_timestamp[timestamp].add(token)
+    metrics.cache(
+        "price", hits=len(prices), misses=sum(len(t) for t in by_timestamp.values())
+    )
+
+    batches = []
+    for timestamp, tokens in sorted(by_timestamp.items()):
+        tokens = sorted(tokens)
+        for i in range(0, len(tokens), COINS_PER_REQUEST):
+            batches.append((timestamp, tokens[i:i + COINS_PER_REQUEST]))
+
+    if batches:
+        print(f"Fetching {sum(len(b[1]) for b in batches)} prices in {len(batches)} requests")
+
+    fetched = {}
+    with ThreadPool(max_workers=MAX_WORKERS) as pool:
+        for result in pool.map(lambda b: _price_batch(chain, *b), batches):
+            fetched.update(result)
+
+    for status, ttl in [(MISSING, MISSING_TTL), (ERROR, ERROR_TTL)]:
+        store.put_many(
+            "price",
+            {
+                _cache_key(chain, token, ts): price
+                for (token, ts), price in fetched.items()
+                if price == status
+            },
+            ttl=ttl,
+        )
+    store.put_many(
+        "price",
+        {
+            _cache_key(chain, token, ts): price
+            for (token, ts), price in fetched.items()
+            if price not in (MISSING, ERROR)
+        },
+    )
+
+    prices.update(fetched)
+    return prices
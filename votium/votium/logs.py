@@ -0,0 +1,123 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import time
+
+# Block window sizes used when splitting a log range into requests
+START_WINDOW = 50_000
+MIN_WINDOW = 100
+MAX_WINDOW = 1_000_000
+GROW_FACTOR = 1.5
+
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+
+# Finished windows that may wait on an earlier, slower window
+MAX_BUFFERED = 32
+
+# Fragments of provider errors that mean the window asked for too much
+TOO_MANY_RESULTS = (
+    "more than",
+    "too many",
+    "limit exceeded",
+    "size exceeded",
+    "response size",
+    "block range",
+    "range is too large",
+    "range too large",
+    "timeout",
+    "timed out",
+)
+
+
+def is_too_many_results(error) -> bool:
+    """Return True if the error means the block window should be shrunk."""
+
+    message = str(error).lower()
+    return any(fragment in message for fragment in TOO_MANY_RESULTS)
+
+
+def log_order(log) -> tuple:
+    """(blockNumber, logIndex) of a decoded log."""
+
+    return log["blockNumber"], log["logIndex"]
+
+
+def _call(get_logs, from_block, to_block, delay):
+    if delay:
+        time.sleep(delay)
+    return get_logs(from_block, to_block)
+
+
+def iter_logs(get_logs,
+              start_block: int,
+              end_block: int,
+              window: int = START_WINDOW,
+              max_workers: int = MAX_WORKERS,
+              key=log_order):
+    """
+    Fetch all logs from start_block to end_block (inclusive), window by window.
+
+    get_logs(from_block, to_block) is called once per block window from a
+    bounded pool of worker threads. Windows that the provider rejects for
+    returning too many results are split in half and retried, and the window
+    size for new requests shrinks with them. Each success grows the window
+    size again up to MAX_WINDOW.
+
+    Yields (from_block, to_block, logs) for contiguous windows in block order,
+    with each window's logs sorted by key, (blockNumber, logIndex) by default.
+    At most MAX_BUFFERED finished windows are held back waiting on an earlier
+    one.
+    """
+
+    if start_block > end_block:
+        return
+
+    retry = []
+    cursor = start_block
+    size = window
+    finished = {}
+    next_block = start_block
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        while next_block <= end_block:
+            while len(futures) < max_workers and (
+                retry or (cursor <= end_block and len(finished) < MAX_BUFFERED)
+            ):
+                if retry:
+                    from_block, to_block, attempt = retry.pop()
+                else:
+                    from_block = cursor
+                    to_block = min(cursor + int(size) - 1, end_block)
+                    attempt = 0
+                    cursor = to_block + 1
+                delay = 2 ** (attempt - 1) if attempt else 0
+                future = pool.submit(_call, get_logs, from_block, to_block, delay)
+                futures[future] = (from_block, to_block, attempt)
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                from_block, to_block, attempt = futures.pop(future)
+                try:
+                    result = list(future.result())
+                except Exception as e:
+                    if is_too_many_results(e) and to_block > from_block:
+                        middle = (from_block + to_block) // 2
+                        retry.append((middle + 1, to_block, 0))
+                        retry.append((from_block, middle, 0))
+                        size = max(MIN_WINDOW, min(size, to_block - from_block + 1) // 2)
+                        print(f"Window {from_block}-{to_block} too large, splitting")
+                    elif attempt < MAX_RETRIES:
+                        retry.append((from_block, to_block, attempt + 1))
+                        print(f"Window {from_block}-{to_block} failed ({e}), retrying")
+                    else:
+                        raise
+                    continue
+
+                result.sort(key=key)
+                finished[from_block] = (to_block, result)
+                size = min(MAX_WINDOW, size * GROW_FACTOR)
+
+            while next_block in finished:
+                to_block, logs = finished.pop(next_block)
+                yield next_block, to_block, logs
+                next_block = to_block + 1
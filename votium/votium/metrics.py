@@ -0,0 +1,216 @@
+"""
+Run metrics: call latencies, cache hit rates and stage throughput.
+
+External calls are timed into latency histograms by call type (rpc:<method>,
+snapshot, llama, file:<kind>). Caches count hits and misses. Stages add up
+the time spent in them and the rows they produce, which gives rows per
+second. Stage time is summed across worker threads, and a stage that calls
+another (incentives fetching a snapshot) includes its time.
+
+Each script writes a JSON run report to REPORT_FILE when it finishes, and a
+Prometheus textfile to VOTIUM_PROMETHEUS_FILE if it is set, for the node
+exporter's textfile collector.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+REPORT_FILE = os.environ.get("VOTIUM_REPORT_FILE", "output/run_report.json")
+PROMETHEUS_FILE = os.environ.get("VOTIUM_PROMETHEUS_FILE")
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_started = time.time()
+_calls = {}
+_cache_hits = defaultdict(int)
+_cache_misses = defaultdict(int)
+_stage_seconds = defaultdict(float)
+_stage_rows = defaultdict(int)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound containing the q quantile."""
+
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 6),
+            "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], self.counts)),
+        }
+
+
+def observe(call: str, seconds: float) -> None:
+    """Record the latency of one external call."""
+
+    with _lock:
+        if call not in _calls:
+            _calls[call] = Histogram()
+        _calls[call].observe(seconds)
+
+
+@contextmanager
+def timer(call: str):
+    """Time the enclosed external call."""
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(call, time.perf_counter() - start)
+
+
+def cache(name: str, hits: int = 0, misses: int = 0) -> None:
+    """Count hits and misses for a cache."""
+
+    with _lock:
+        _cache_hits[name] += hits
+        _cache_misses[name] += misses
+
+
+@contextmanager
+def stage(name: str):
+    """Add the time spent in the enclosed block to a stage."""
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _stage_seconds[name] += time.perf_counter() - start
+
+
+def rows(stage: str, count: int) -> None:
+    """Count rows produced by a stage."""
+
+    with _lock:
+        _stage_rows[stage] += count
+
+
+def report() -> dict:
+    """Return the metrics recorded so far."""
+
+    with _lock:
+        caches = {}
+        for name in sorted(_cache_hits.keys() | _cache_misses.keys()):
+            hits, misses = _cache_hits[name], _cache_misses[name]
+            caches[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            }
+
+        stages = {}
+        for name in sorted(_stage_seconds.keys() | _stage_rows.keys()):
+            seconds, count = _stage_seconds[name], _stage_rows[name]
+            stages[name] = {
+                "seconds": round(seconds, 3),
+                "rows": count,
+                "rows_per_sec": round(count / seconds, 1) if seconds else None,
+            }
+
+        return {
+            "started": _started,
+            "duration": round(time.time() - _started, 3),
+            "calls": {call: h.to_dict() for call, h in sorted(_calls.items())},
+            "caches": caches,
+            "stages": stages,
+        }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus(data: dict) -> str:
+    """Format a report in the Prometheus text exposition format."""
+
+    lines = ["# TYPE votium_call_seconds histogram"]
+    for call, h in data["calls"].items():
+        cumulative = 0
+        for bound, n in h["buckets"].items():
+            cumulative += n
+            lines.append(
+                f'votium_call_seconds_bucket{{call="{_label(call)}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(f'votium_call_seconds_sum{{call="{_label(call)}"}} {h["total"]}')
+        lines.append(f'votium_call_seconds_count{{call="{_label(call)}"}} {h["count"]}')
+
+    lines.append("# TYPE votium_cache_hits_total counter")
+    lines.extend(
+        f'votium_cache_hits_total{{cache="{name}"}} {c["hits"]}'
+        for name, c in data["caches"].items()
+    )
+    lines.append("# TYPE votium_cache_misses_total counter")
+    lines.extend(
+        f'votium_cache_misses_total{{cache="{name}"}} {c["misses"]}'
+        for name, c in data["caches"].items()
+    )
+
+    lines.append("# TYPE votium_stage_seconds gauge")
+    lines.extend(
+        f'votium_stage_seconds{{stage="{name}"}} {s["seconds"]}'
+        for name, s in data["stages"].items()
+    )
+    lines.append("# TYPE votium_stage_rows gauge")
+    lines.extend(
+        f'votium_stage_rows{{stage="{name}"}} {s["rows"]}'
+        for name, s in data["stages"].items()
+    )
+
+    lines.append("# TYPE votium_run_seconds gauge")
+    lines.append(f"votium_run_seconds {data['duration']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(path: str = REPORT_FILE) -> dict:
+    """Write the JSON run report, and the Prometheus textfile if configured."""
+
+    # Imported here as files itself records write latencies
+    from votium.files import atomic_open
+
+    data = report()
+    with atomic_open(path) as f:
+        json.dump(data, f, indent=2)
+    if PROMETHEUS_FILE:
+        with atomic_open(PROMETHEUS_FILE) as f:
+            f.write(prometheus(data))
+    print(f"Run report written to {path}")
+    return data
@@ -0,0 +1,30 @@
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+# Multicall3 is deployed at the same address on every major chain
+MULTICALL3_ADDRESS = to_checksum_address("0xca11bde05779ba9ed3921bf7c2a10d3f6b5f8937")
+AGGREGATE3 = function_signature_to_4byte_selector("aggregate3((address,bool,bytes)[])")
+
+# Calls per aggregate3 request
+BATCH_SIZE = 300
+
+
+def aggregate(w3, calls: list, batch_size: int = BATCH_SIZE) -> list:
+    """
+    Run (target, calldata) calls through Multicall3 aggregate3.
+
+    Every call is allowed to fail. Returns the return data for each call in
+    order, or None for calls that reverted.
+    """
+
+    results = []
+    for i in range(0, len(calls), batch_size):
+        batch = calls[i:i + batch_size]
+        calldata = AGGREGATE3 + encode(
+            ["(address,bool,bytes)[]"],
+            [[(target, True, data) for target, data in batch]],
+        )
+        raw = w3.eth.call({"to": MULTICALL3_ADDRESS, "data": "0x" + calldata.hex()})
+        (decoded,) = decode(["(bool,bytes)[]"], bytes(raw))
+        results.extend(data if success else None for success, data in decoded)
+    return results
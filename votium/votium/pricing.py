@@ -0,0 +1,59 @@
+"""
+Vectorized pricing of a round's incentives.
+
+The kernel takes columns instead of rows, so a round can be repriced against
+any price table without re-walking the incentives in Python.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+
+
+def scale_amount(amount, decimals: int) -> Decimal:
+    """Scale a raw integer token amount by its decimals, exactly."""
+
+    return Decimal(f"{int(amount)}e-{int(decimals)}")
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # MISSING / ERROR markers
+        return np.nan
+
+
+def price_incentives(gauges, amounts, decimals, prices, unadj_scores) -> tuple:
+    """
+    Compute the vote share and USD values for a round of incentives.
+
+    Each argument is a column with one entry per incentive. The gauge score
+    is split evenly across the incentive deposits for that gauge. Prices that
+    are not numbers give NaN values.
+
+    Returns (exact_amounts, scores, usd_values, per_votes), where
+    exact_amounts is a list of Decimals and the rest are float64 arrays.
+    """
+
+    exact_amounts = [scale_amount(a, d) for a, d in zip(amounts, decimals)]
+    if not exact_amounts:
+        empty = np.empty(0)
+        return exact_amounts, empty, empty, empty
+
+    # Number of incentive deposits for each row's gauge
+    _, inverse, counts = np.unique(
+        np.asarray(gauges, dtype=object), return_inverse=True, return_counts=True
+    )
+    deposits = counts[inverse]
+
+    unadj = np.asarray(unadj_scores, dtype=np.float64)
+    scores = np.where(unadj == 0, 0.0, unadj / deposits)
+
+    amount = np.array([float(a) for a in exact_amounts])
+    price = np.array([_to_float(p) for p in prices], dtype=np.float64)
+    usd_values = amount * price
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_votes = np.where(scores != 0, usd_values / scores, 0.0)
+
+    return exact_amounts, scores, usd_values, per_votes
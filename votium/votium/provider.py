@@ -0,0 +1,330 @@
+"""
+Shared JSON-RPC provider pool.
+
+WEB3_HTTP_PROVIDER may list several endpoints separated by commas. Every
+request goes to the healthiest endpoint with a free rate limit token, over a
+keep-alive session per endpoint. Transport errors, 429s, 5xx responses and
+rate limit errors put the endpoint on a short cooldown and the request is
+retried, with jitter, on the next endpoint, as is a batch answered with a
+single error instead of a list. Other JSON-RPC errors (reverts, too many
+logs) are returned to the caller unchanged.
+
+Endpoints can lag each other, and one that lags answers eth_getLogs past its
+head with no logs. Scans therefore stop at head(), the lowest head block of
+all the endpoints.
+
+Identical calls that are in flight at the same time, such as two threads
+asking for the same block, share a single request. The pool only carries
+read calls, so this is always safe.
+"""
+
+from concurrent.futures import Future
+from functools import lru_cache
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3._utils.encoding import Web3JsonEncoder
+from web3.providers.base import JSONBaseProvider
+
+from votium import metrics
+
+DEFAULT_ENDPOINT = "http://localhost:8545"
+
+# Requests per second allowed on each endpoint
+RATE_LIMIT = float(os.environ.get("WEB3_RATE_LIMIT", "25"))
+MAX_RETRIES = int(os.environ.get("WEB3_MAX_RETRIES", "5"))
+TIMEOUT = 60
+
+# Seconds; retries sleep a random time up to BACKOFF * 2 ** attempt
+BACKOFF = 0.25
+MAX_BACKOFF = 10
+
+# Failing endpoints sit out COOLDOWN * 2 ** (failures - 1) seconds
+COOLDOWN = 1
+MAX_COOLDOWN = 60
+
+# Concurrent requests worth sending to each endpoint
+WORKERS_PER_ENDPOINT = 4
+
+# Fragments of JSON-RPC errors that mean the endpoint is throttling us
+RATE_LIMITED = (
+    "rate limit",
+    "too many requests",
+    "exceeded the quota",
+    "capacity exceeded",
+    "daily request count exceeded",
+)
+
+
+class TokenBucket:
+    """Token bucket allowing rate requests per second with bursts up to rate."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is free."""
+
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self) -> None:
+        """Take a token, sleeping until it is free. Waiters are served in order."""
+
+        if not self.rate:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Endpoint:
+    """One RPC endpoint with its session, rate limit and health."""
+
+    def __init__(self, url: str, rate_limit: float):
+        self.url = url
+        self.bucket = TokenBucket(rate_limit)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WORKERS_PER_ENDPOINT * 4)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def name(self) -> str:
+        # Keep API keys in the path out of the logs
+        return self.url.split("//")[-1].split("/")[0]
+
+    def succeeded(self):
+        self.failures = 0
+        self.down_until = 0.0
+
+    def failed(self):
+        self.failures += 1
+        cooldown = min(MAX_COOLDOWN, COOLDOWN * 2 ** (self.failures - 1))
+        self.down_until = time.monotonic() + cooldown
+
+
+def _is_rate_limited(response) -> bool:
+    responses = response if isinstance(response, list) else [response]
+    return any(
+        fragment in str(r.get("error", "")).lower()
+        for r in responses
+        for fragment in RATE_LIMITED
+    )
+
+
+class ProviderPool:
+    """Spread JSON-RPC requests over several endpoints."""
+
+    def __init__(self,
+                 urls: list,
+                 rate_limit: float = RATE_LIMIT,
+                 max_retries: int = MAX_RETRIES):
+        if not urls:
+            raise ValueError("ProviderPool needs at least one endpoint")
+        self.endpoints = [Endpoint(url, rate_limit) for url in urls]
+        self.max_retries = max_retries
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    @property
+    def workers(self) -> int:
+        """Number of concurrent requests the pool is sized for."""
+
+        return len(self.endpoints) * WORKERS_PER_ENDPOINT
+
+    def _choose(self, tried):
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e not in tried] or self.endpoints
+        healthy = [e for e in candidates if e.down_until <= now]
+        if healthy:
+            return min(healthy, key=lambda e: (e.bucket.wait_time(), e.failures))
+        # Everything is cooling down, so try the one that recovers first
+        return min(candidates, key=lambda e: e.down_until)
+
+    def _send(self, payload):
+        """POST a JSON-RPC payload, failing over between endpoints."""
+
+        data = json.dumps(payload, cls=Web3JsonEncoder)
+        if isinstance(payload, list):
+            call = f"rpc:batch:{payload[0]['method']}"
+        else:
+            call = f"rpc:{payload['method']}"
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            endpoint = self._choose(tried)
+            tried.add(endpoint)
+            endpoint.bucket.acquire()
+            try:
+                with metrics.timer(call):
+                    response = endpoint.session.post(
+                        endpoint.url,
+                        data=data,
+                        headers={"Content-Type": "application/json"},
+                        timeout=TIMEOUT,
+                    )
+            except requests.exceptions.RequestException as e:
+                error = e
+            else:
+                if response.status_code == 429 or response.status_code >= 500:
+                    error = f"HTTP {response.status_code}"
+                else:
+                    # Any other HTTP error is a problem with the request itself
+                    response.raise_for_status()
+                    try:
+                        result = response.json()
+                    except ValueError as e:
+                        error = e
+                    else:
+                        if _is_rate_limited(result):
+                            error = "rate limited"
+                        elif isinstance(payload, list) and not isinstance(result, list):
+                            error = f"batch answered with {result}"
+                        else:
+                            endpoint.succeeded()
+                            return result
+
+            endpoint.failed()
+            if attempt == self.max_retries:
+                raise ConnectionError(
+                    f"RPC request failed after {attempt + 1} attempts: {error}"
+                )
+            print(f"RPC request to {endpoint.name} failed ({error}), retrying")
+            time.sleep(random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt)))
+
+    def head(self) -> int:
+        """
+        Return the lowest head block of the endpoints that answer.
+
+        Endpoints that do not answer are put on cooldown, so they are not
+        asked for blocks they may not have right after.
+        """
+
+        data = json.dumps({"jsonrpc": "2.0", "id": 0, "method": "eth_blockNumber", "params": []})
+        heads = []
+        for endpoint in self.endpoints:
+            endpoint.bucket.acquire()
+            try:
+                with metrics.timer("rpc:eth_blockNumber"):
+                    response = endpoint.session.post(
+                        endpoint.url,
+                        data=data,
+                        headers={"Content-Type": "application/json"},
+                        timeout=TIMEOUT,
+                    )
+                response.raise_for_status()
+                heads.append(int(response.json()["result"], 16))
+            except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+                endpoint.failed()
+                print(f"Could not get the head block from {endpoint.name} ({e})")
+            else:
+                endpoint.succeeded()
+        if not heads:
+            raise ConnectionError("No endpoint returned its head block")
+        return min(heads)
+
+    def request(self, method: str, params) -> dict:
+        """
+        Make one JSON-RPC call and return the full response.
+
+        Concurrent identical calls share one request.
+        """
+
+        key = json.dumps([method, params], cls=Web3JsonEncoder, sort_keys=True)
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return dict(future.result())
+
+        try:
+            response = self._send(
+                {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+            )
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def batch(self, calls: list) -> list:
+        """
+        Make several JSON-RPC calls in one HTTP request.
+
+        calls is a list of (method, params). Returns the results in the same
+        order, raising ValueError if any call returned an error.
+        """
+
+        if not calls:
+            return []
+        payload = [
+            {"jsonrpc": "2.0", "id": n, "method": method, "params": params}
+            for n, (method, params) in enumerate(calls)
+        ]
+        results = [None] * len(calls)
+        for response in self._send(payload):
+            if "error" in response:
+                raise ValueError(response["error"])
+            results[response["id"]] = response["result"]
+        return results
+
+
+class PooledProvider(JSONBaseProvider):
+    """web3 provider that sends every request through a ProviderPool."""
+
+    def __init__(self, pool: ProviderPool):
+        super().__init__()
+        self.pool = pool
+
+    def make_request(self, method, params):
+        return self.pool.request(method, params)
+
+
+@lru_cache(maxsize=None)
+def get_pool() -> ProviderPool:
+    """Return the shared pool for the endpoints in WEB3_HTTP_PROVIDER."""
+
+    load_dotenv()
+    urls = [
+        url.strip()
+        for url in os.environ.get("WEB3_HTTP_PROVIDER", "").split(",")
+        if url.strip()
+    ]
+    return ProviderPool(urls or [DEFAULT_ENDPOINT])
+
+
+@lru_cache(maxsize=None)
+def get_web3() -> Web3:
+    """Return the shared Web3 instance backed by the provider pool."""
+
+    return Web3(PooledProvider(get_pool()))
@@ -1,62 +1,134 @@
 import datetime
-import pytz
+import time
+
+# Rounds start every 14 days from the first round and run for 5 days
+ROUND_EPOCH = datetime.datetime(2021, 9, 16, tzinfo=datetime.timezone.utc)
+ROUND_PERIOD = datetime.timedelta(days=14)
+ROUND_LENGTH = datetime.timedelta(days=5)
+
+EPOCH_SECONDS = int(ROUND_EPOCH.timestamp())
+PERIOD_SECONDS = int(ROUND_PERIOD.total_seconds())
+LENGTH_SECONDS = int(ROUND_LENGTH.total_seconds())
+
+# How long a "now" snapshot is reused before the clock is read again
+NOW_TTL = 60
+
+
+class RoundCalendar:
+    """
+    Round numbers and windows computed directly from the 14-day cadence.
+
+    Round n starts ROUND_PERIOD * (n - 1) after ROUND_EPOCH and ends
+    ROUND_LENGTH later (inclusive). A round exists once it has started.
+    """
+
+    def __init__(self, now_ttl: float = NOW_TTL):
+        self.now_ttl = now_ttl
+        self._now = None
+        self._now_read_at = 0.0
+
+    def now(self) -> float:
+        """Return the cached current unix time, refreshed every now_ttl seconds."""
+
+        monotonic = time.monotonic()
+        if self._now is None or monotonic - self._now_read_at > self.now_ttl:
+            self._now = time.time()
+            self._now_read_at = monotonic
+        return self._now
+
+    def last_round(self) -> int:
+        """Return the number of rounds that have started."""
+
+        elapsed = self.now() - EPOCH_SECONDS
+        if elapsed <= 0:
+            return 0
+        return int(-(-elapsed // PERIOD_SECONDS))
+
+    def dates_for_round(self, round):
+        """Return [round_start, round_end] as UTC datetimes, or None."""
+
+        if not 1 <= round <= self.last_round():
+            return None
+        round_start = ROUND_EPOCH + ROUND_PERIOD * (round - 1)
+        return [round_start, round_start + ROUND_LENGTH]
+
+    def round_for_timestamp(self, timestamp):
+        """Return the round containing a unix timestamp, or None."""
+
+        elapsed = timestamp - EPOCH_SECONDS
+        if elapsed < 0:
+            return None
+        round = int(elapsed // PERIOD_SECONDS) + 1
+        if elapsed % PERIOD_SECONDS > LENGTH_SECONDS or round > self.last_round():
+            return None
+        return round
+
+    def rounds_for_timestamps(self, timestamps):
+        """
+        Return the round for each of an array of unix timestamps.
+
+        Returns a NumPy int64 array with 0 where a timestamp is not in a round.
+        """
+
+        import numpy as np
+
+        elapsed = np.asarray(timestamps, dtype=np.int64) - EPOCH_SECONDS
+        rounds = elapsed // PERIOD_SECONDS + 1
+        valid = (
+            (elapsed >= 0)
+            & (elapsed % PERIOD_SECONDS <= LENGTH_SECONDS)
+            & (rounds <= self.last_round())
+        )
+        return np.where(valid, rounds, 0)
+
+    def current_round(self):
+        """Return the current round, or None if not in a round."""
+
+        return self.round_for_timestamp(self.now())
+
+
+CALENDAR = RoundCalendar()
+
 
 def get_rounds():
     """Return a list of all round dates in form [round_start, round_end]."""
 
-    round_dates = []
-    # current_time_utc = datetime.datetime.utcnow()
-    current_time_utc = pytz.utc.localize(datetime.datetime.now())
-    round = 1
-    round_start = pytz.utc.localize(datetime.datetime.strptime('2021-09-16', '%Y-%m-%d'))
-    round_end = round_start + datetime.timedelta(days=5)
-    while (round_start < current_time_utc):
-        # print(f"{round}: {round_start} = {round_end}")
-        round_dates.append([round_start, round_end])
-        round += 1
-        round_start += datetime.timedelta(days=14)
-        round_end = round_start + datetime.timedelta(days=5)
-    return round_dates
+    return [
+        CALENDAR.dates_for_round(round)
+        for round in range(1, CALENDAR.last_round() + 1)
+    ]
 
 
 def get_current_round():
     """Return the current round, or None if not in a round."""
 
-    rounds = get_rounds()
-    current_time_utc = pytz.utc.localize(datetime.datetime.now())
-    for i, (round_start, round_end) in enumerate(rounds):
-        if round_start <= current_time_utc <= round_end:
-            return i + 1
-    return None
+    return CALENDAR.current_round()
 
 
 def get_round_for_date(date):
     """Return the round for a given date. The date will converted to UTC."""
 
-    utc_date = pytz.utc.localize(date)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return CALENDAR.round_for_timestamp(date.timestamp())
+
+
+def get_round_for_timestamp(timestamp):
+    """Return the round for a unix timestamp, or None if not in a round."""
 
-    i = 0
-    for round_start, round_end in get_rounds():
-        i += 1
-        if round_start <= utc_date <= round_end:
-            return i
-    return None
+    return CALENDAR.round_for_timestamp(timestamp)
 
 
 def get_dates_for_round(round):
     """Return the dates [round_start, round_end] for a given round."""
 
-    rounds = get_rounds()
-    if 1 <= round <= len(rounds):
-        return rounds[round-1]
-    return None
+    return CALENDAR.dates_for_round(round)
 
 
 def get_last_round():
     """Return the last round completed (or in progress)."""
 
-    rounds = get_rounds()
-    return len(rounds)
+    return CALENDAR.last_round()
 
 
 def get_last_completed_round():
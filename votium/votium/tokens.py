@@ -0,0 +1,91 @@
+from eth_abi import decode
+from eth_utils import function_signature_to_4byte_selector
+from votium.multicall import aggregate
+
+SYMBOL = function_signature_to_4byte_selector("symbol()")
+NAME = function_signature_to_4byte_selector("name()")
+DECIMALS = function_signature_to_4byte_selector("decimals()")
+
+UNKNOWN = "UNKNOWN"
+
+
+def _decode_text(data):
+    """Decode a string return value, falling back to bytes32 (e.g. MKR)."""
+
+    if not data:
+        return None
+    try:
+        return decode(["string"], data)[0]
+    except Exception:
+        pass
+    if len(data) == 32:
+        return data.rstrip(b"\0").decode("utf-8", errors="replace")
+    return None
+
+
+def _decode_uint(data):
+    if not data or len(data) < 32:
+        return None
+    try:
+        return decode(["uint256"], data[:32])[0]
+    except Exception:
+        return None
+
+
+def _call(w3, target, data) -> tuple:
+    """
+    Make one call on its own and return (return data, confirmed).
+
+    A revert is final and gives (None, True). Any other failure, such as an
+    unreachable node or running out of gas, gives (None, False).
+    """
+
+    from web3.exceptions import ContractLogicError
+
+    try:
+        return bytes(w3.eth.call({"to": target, "data": "0x" + data.hex()})), True
+    except ContractLogicError:
+        return None, True
+    except Exception as e:
+        print(f"Call to {target} failed ({e})")
+        return None, False
+
+
+def resolve_tokens(w3, token_addresses) -> tuple:
+    """
+    Resolve symbol, name and decimals for many tokens at once.
+
+    Returns ({token_address: (symbol, name, decimals)}, unconfirmed). Tokens
+    that revert or return garbage get UNKNOWN for text fields and None for
+    decimals. unconfirmed holds the tokens where a call failed without a
+    revert, whose metadata may be wrong and should not be kept.
+    """
+
+    token_addresses = list(dict.fromkeys(token_addresses))
+    calls = []
+    for token_address in token_addresses:
+        calls.extend([
+            (token_address, SYMBOL),
+            (token_address, NAME),
+            (token_address, DECIMALS),
+        ])
+    results = aggregate(w3, calls)
+
+    # A call can fail inside the multicall without reverting, e.g. by running
+    # out of gas, so failed calls are made again on their own
+    unconfirmed = set()
+    for n, (token_address, data) in enumerate(calls):
+        if results[n] is None:
+            results[n], confirmed = _call(w3, token_address, data)
+            if not confirmed:
+                unconfirmed.add(token_address)
+
+    tokens = {}
+    for i, token_address in enumerate(token_addresses):
+        symbol, name, decimals = results[i * 3:i * 3 + 3]
+        tokens[token_address] = (
+            _decode_text(symbol) or UNKNOWN,
+            _decode_text(name) or UNKNOWN,
+            _decode_uint(decimals),
+        )
+    return tokens, unconfirmed